@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+'''Microbenchmark for SVGElement.new(), isolated from shape helpers.
+
+Run from the root of the repository:
+
+    PYTHONPATH=. python3 benchmarks/svg_new.py
+
+'''
+
+import timeit
+
+from cbg.svg import svg
+
+
+N = 20000
+
+
+class Element(svg.SVGElement):
+    TAG = 'rect'
+
+
+def main():
+    keywords = dict(fill='#ffffff', font_family='Arial', font_size='2.9px',
+                    stroke='#000000', stroke_width=0.5, text_anchor='middle')
+    style = ';'.join('{}:{}'.format(svg.python_to_svg_key(k), v)
+                     for k, v in sorted(keywords.items()))
+    mapping = svg.KeyValuePairs(keywords)
+
+    cases = (('keyword style',
+              lambda: Element.new(x='1.0', y='2.0', **keywords)),
+             ('string style',
+              lambda: Element.new(x='1.0', y='2.0', style=style)),
+             ('mapping style',
+              lambda: Element.new(x='1.0', y='2.0', style=mapping)),
+             ('no style',
+              lambda: Element.new(x='1.0', y='2.0')),
+             )
+
+    for name, function in cases:
+        seconds = min(timeit.repeat(function, number=N, repeat=15))
+        print('{:<16}{:8.2f} µs per element'.format(name, seconds / N * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -9,6 +9,8 @@ from . import sample
 from . import svg
 from . import content
 from . import app
+from . import render
 
-__all__ = [app, content, cursor, geometry, keys, misc, sample, svg]
+__all__ = [app, content, cursor, geometry, keys, misc, render, sample,
+           svg]
 __version__ = '0.13.0'
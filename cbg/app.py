@@ -23,14 +23,25 @@ import argparse
 import ast
 import os
 import glob
+import json
 import logging
 import re
-import subprocess
 import math
+import socket
+import socketserver
+import stat
+import threading
+import time
 
 import cbg.content.deck
+import cbg.external
 import cbg.sample.size
 import cbg.layout
+import cbg.raster
+import cbg.render
+import cbg.serialization
+import cbg.sink
+import cbg.svg.svg
 
 
 class Application():
@@ -45,10 +56,42 @@ class Application():
     # Default raster resolution is the capacity of an HP LaserJet 1010.
     default_dpi = 600
 
+    # Seconds between checks for changes to specifications, in watch mode.
+    watch_interval = 1
+
+    # The default is one Inkscape startup per run, rather than per image.
+    default_rasterizer = cbg.raster.InkscapeShell.name
+
     class ExternalError(Exception):
         '''Raised when a subprocess cannot be called, or fails.'''
         pass
 
+    class Manifest(dict):
+        '''Content digests of the files in an output folder, by filename.
+
+        Used for incremental builds. The manifest is itself stored as
+        a hidden file in the folder it describes.
+
+        '''
+
+        filename = '.manifest.json'
+
+        def __init__(self, folder):
+            super().__init__()
+            self.filepath = os.path.join(folder, self.filename)
+            try:
+                self.update(cbg.serialization.Serialization.load(
+                    self.filepath))
+            except FileNotFoundError:
+                pass
+            except ValueError:
+                s = 'Ignoring unreadable manifest "{}".'
+                logging.warning(s.format(self.filepath))
+
+        def save(self):
+            with open(self.filepath, mode='w', encoding='utf-8') as f:
+                f.write(cbg.serialization.Serialization.dumps(self))
+
     def __init__(self, name_full, decks, name_short=None,
                  folder_specs='specs', folder_svg='svg', folder_png='png'):
         '''Constructor.
@@ -77,6 +120,17 @@ class Application():
         self.args = self.check_cli(self.make_cli())
         self.configure_logging()
 
+        # In watch mode, signatures of images saved in the previous round.
+        # Signatures refer to cards by identity, so the cards are kept too,
+        # preventing the reuse of identities by new cards. The images are
+        # not kept, nor their SVG trees.
+        self._image_signatures = dict()
+        self._signed_cards = ()
+
+        # In serve mode, the server, and an event set while it runs.
+        self._server = None
+        self.serving = threading.Event()
+
     def make_cli(self):
         '''Create, but do not run, a command-line argument parser.'''
 
@@ -147,6 +201,57 @@ class Application():
         subgroup.add_argument('--viewer', dest='display', metavar='APP',
                               nargs='?', const=True, help=s)
 
+        def positive_int(value):
+            '''Type-checking function for argparse.'''
+            value = int(value)
+            if value < 1:
+                s = 'not a positive integer: {}'.format(value)
+                raise argparse.ArgumentTypeError(s)
+            return value
+
+        s = 'render, save and rasterize images in N parallel jobs'
+        parser.add_argument('-j', '--jobs', metavar='N', type=positive_int,
+                            default=1, help=s)
+
+        s = ('kill any external program, except a viewer, after SECONDS '
+             'without finishing, or SECONDS per image when rasterizing')
+        parser.add_argument('--timeout', metavar='SECONDS',
+                            type=positive_int, default=None, help=s)
+
+        s = ('draw and save one image at a time, releasing each before '
+             'the next, to limit memory use on large runs')
+        parser.add_argument('--stream', default=False, action='store_true',
+                            help=s)
+
+        s = ('save each distinct card drawing once per image, as a symbol '
+             'referenced by every copy')
+        parser.add_argument('--symbols', default=False, action='store_true',
+                            help=s)
+
+        s = ('derive the IDs of definitions from their contents, merging '
+             'identical ones and making output reproducible; implied by '
+             'incremental builds and by more than one job')
+        parser.add_argument('--content-ids', default=False,
+                            action='store_true', help=s)
+
+        s = ('keep output from previous runs, rewriting only changed files '
+             'and removing stale ones last')
+        parser.add_argument('-i', '--incremental', default=False,
+                            action='store_true', help=s)
+
+        s = ('keep running, rebuilding incrementally when specifications '
+             'change')
+        parser.add_argument('--watch', default=False, action='store_true',
+                            help=s)
+
+        s = ('keep running, with decks in memory, rendering on request '
+             'through a Unix socket at PATH')
+        parser.add_argument('--serve', metavar='PATH', default=None, help=s)
+
+        s = ('save SVG to an archive at PATH instead of a folder: zip or '
+             'tar by suffix, or a tar stream to standard output for "-"')
+        parser.add_argument('--archive', metavar='PATH', default=None, help=s)
+
         s = 'include the title of the first depicted card in each filename'
         parser.add_argument('--card-in-filename', default=False,
                             action='store_true', help=s)
@@ -197,14 +302,22 @@ class Application():
         # As with --display, we provide an option for default DPI that cannot
         # be confused with subsequent arguments.
         subgroup = group.add_mutually_exclusive_group()
-        s = 'bitmap output via Inkscape at {} DPI'.format(self.default_dpi)
+        s = 'bitmap output at {} DPI'.format(self.default_dpi)
         subgroup.add_argument('-r', '--rasterize', action='store_const',
                               const=self.default_dpi, help=s)
-        s = 'bitmap output via Inkscape at any resolution'
+        s = 'bitmap output at any resolution'
         subgroup.add_argument('--dpi', metavar='DPI', nargs='?',
                               dest='rasterize', const=self.default_dpi,
                               type=nonnegative_int, help=s)
 
+        s = 'external program for bitmap output (default: {})'
+        product.add_argument('--rasterizer', metavar='NAME',
+                             choices=sorted(cbg.raster.Rasterizer.registry),
+                             default=self.default_rasterizer,
+                             help=s.format(self.default_rasterizer))
+        s = 'reuse bitmaps of unchanged images, stored in DIR across runs'
+        product.add_argument('--raster-cache', metavar='DIR', help=s)
+
         def numeric_2tuple(value):
             '''Type-checking function for argparse.'''
             if not re.match('^\(.*\)$', value):
@@ -302,6 +415,30 @@ class Application():
             if not args.rasterize:
                 args.rasterize = self.default_dpi
 
+        if args.watch:
+            if args.print or args.list_cards or args.list_images:
+                parser.error('cannot watch while printing or listing')
+            args.incremental = True
+
+        if args.incremental:
+            # Counted IDs would change the digests of unchanged images.
+            args.content_ids = True
+
+        if args.serve:
+            if args.print or args.list_cards or args.list_images:
+                parser.error('cannot serve while printing or listing')
+            if args.watch:
+                parser.error('cannot serve while watching')
+
+        if args.archive:
+            if (args.rasterize or args.document or args.display or
+                    args.watch or args.serve):
+                parser.error('cannot use SVG files in an archive')
+            if args.incremental:
+                parser.error('cannot update an archive incrementally')
+            if args.archive == '-' and args.list_images:
+                parser.error('cannot list images while streaming')
+
         return args
 
     def configure_logging(self):
@@ -315,9 +452,19 @@ class Application():
         logging.getLogger().setLevel(level)
 
     def execute(self):
-        # Clean up after previous runs.
-        self.delete_old_files(self.folder_svg)
-        self.delete_old_files(self.folder_png)
+        if self.args.content_ids:
+            cbg.svg.svg.SVGElement.content_addressed_ids = True
+
+        if self.args.serve:
+            return self.serve(self.args.serve)
+
+        if not self.args.incremental and not self.args.archive:
+            # Clean up after previous runs.
+            self.delete_old_files(self.folder_svg)
+            self.delete_old_files(self.folder_png)
+
+        if self.args.watch:
+            return self.watch()
 
         # Collect and sieve through deck specifications.
         decks = self.read_deck_specs()
@@ -338,6 +485,180 @@ class Application():
             logging.error(str(e))
             return 1
 
+    def watch(self):
+        '''Rebuild whenever specifications change, until interrupted.
+
+        Specification files are polled for changes in modification time.
+        Only the decks of changed files are read again. Images whose
+        cards and layout are unchanged are not rendered again.
+
+        '''
+        known = dict()  # Modification times and decks by filename base.
+        try:
+            while True:
+                if self._refresh_decks(known):
+                    decks = [deck for _, deck in known.values()]
+                    if None in decks:
+                        logging.info('Waiting for valid specifications.')
+                    else:
+                        self._rebuild(decks)
+                time.sleep(self.watch_interval)
+        except KeyboardInterrupt:
+            return 0
+
+    def serve(self, socket_path):
+        '''Render on request, until interrupted.
+
+        Decks are kept in memory, along with caches built up while drawing.
+        Specification files are read again only when they change.
+
+        Requests and responses are JSON objects, one per line, through a
+        Unix socket. See render() for requests, and render_request() for
+        a client.
+
+        '''
+        known = dict()  # Modification times and decks by filename base.
+        application = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    response = application._respond(known, line)
+                    self.wfile.write(json.dumps(response).encode() + b'\n')
+
+        try:
+            if stat.S_ISSOCK(os.stat(socket_path).st_mode):
+                # Left over from a previous daemon.
+                os.remove(socket_path)
+        except FileNotFoundError:
+            pass
+
+        # Read specifications before the first request.
+        self._refresh_decks(known)
+
+        with socketserver.UnixStreamServer(socket_path, Handler) as server:
+            logging.info('Serving on {}.'.format(socket_path))
+            self._server = server
+            self.serving.set()
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.serving.clear()
+                self._server = None
+                os.remove(socket_path)
+        return 0
+
+    def stop_serving(self):
+        '''Stop a daemon serving from another thread.
+
+        Return when the server has stopped accepting requests.
+
+        '''
+        server = self._server
+        if server is not None:
+            server.shutdown()
+
+    def _respond(self, known, line):
+        '''Handle one request to a daemon. Return a response.'''
+        try:
+            return self.render(known, **json.loads(line.decode()))
+        except Exception as e:
+            logging.error('Request failed: {}'.format(e))
+            return {'error': str(e)}
+
+    def render(self, known, deck=None, title='', side='obverse',
+               layouter='default', folder=None):
+        '''Render cards from decks in memory, reading changed specifications.
+
+        "known" is a dictionary of decks, as for watch mode. Cards are
+        selected by the filename base of their deck, if any, and by a
+        regular expression matched against their titles. The side and
+        layouter are as for cbg.render.lay_out().
+
+        If a folder is named, pages are saved there. Else, their SVG code
+        is returned. Return a dictionary with a list of pages, each
+        described by a dictionary including its filename.
+
+        '''
+        start = time.monotonic()
+        self._refresh_decks(known)
+
+        decks = []
+        for filename_base in (self.decks if deck is None else (deck,)):
+            if known.get(filename_base, (None, None))[1] is None:
+                s = 'Deck "{}" is unknown or unreadable.'
+                raise ValueError(s.format(filename_base))
+            decks.append(known[filename_base][1])
+
+        images = cbg.render.lay_out(decks, layouter=layouter, side=side,
+                                    title=title, naming=self._naming(),
+                                    image_size=self.args.image_size,
+                                    image_margins=self.args.margins,
+                                    arc=self.args.arc)
+
+        if folder is None:
+            pages = [{'filename': image.filename,
+                      'svg': image.serialize().decode()}
+                     for image in images]
+        else:
+            os.makedirs(folder, exist_ok=True)
+            images.save(folder, **self._naming())
+            pages = [{'filename': image.filename, 'path': image.filepath}
+                     for image in images]
+
+        s = 'Rendered {} card(s) on {} page(s) in {:.3f} s.'
+        logging.info(s.format(len(images.cards), len(pages),
+                              time.monotonic() - start))
+        return {'pages': pages}
+
+    def _refresh_decks(self, known):
+        '''Read decks whose specifications have changed. Return a Boolean.
+
+        Unreadable specifications are logged and represented by None.
+
+        '''
+        changed = False
+        for filename_base, card_cls in self.decks.items():
+            try:
+                filepath = cbg.content.deck.Deck.find_spec_file(
+                    self.folder_specs, filename_base)
+                mtime = os.stat(filepath).st_mtime
+            except FileNotFoundError as e:
+                mtime = None
+                error = e
+            if filename_base in known and known[filename_base][0] == mtime:
+                continue
+
+            changed = True
+            if mtime is None:
+                logging.error(str(error))
+                known[filename_base] = (mtime, None)
+                continue
+
+            try:
+                deck = self.read_deck_spec(filename_base, card_cls)
+            except Exception as e:
+                s = 'Failed to read {}: {}'
+                logging.error(s.format(filepath, e))
+                deck = None
+            known[filename_base] = (mtime, deck)
+
+        return changed
+
+    def _rebuild(self, decks):
+        '''Produce output from decks, logging rather than raising errors.'''
+        logging.info('Building.')
+        try:
+            self._output(self.vectorize(decks))
+        except self.ExternalError as e:
+            logging.error(str(e))
+        except Exception as e:
+            logging.error('Build failed: {}'.format(e))
+        else:
+            logging.info('Done.')
+
     def _output(self, images):
         '''Consider showing on screen, printing etc.
 
@@ -352,8 +673,7 @@ class Application():
             except FileExistsError:
                 logging.debug('Destination folder for PNG already exists.')
 
-            for image in images:
-                image.filepath = self.rasterize(image.filepath)
+            self.rasterize_all(images)
 
         elif self.args.document:
             filepath = self.args.document
@@ -378,7 +698,8 @@ class Application():
             if isinstance(self.args.display, str):
                 viewer = self.args.display
 
-            self._external_process([viewer, filename])
+            # A viewer runs for as long as the user wants.
+            self._external_process([viewer, filename], timeout=None)
 
         elif self.args.list_images:
             presentation = dict()
@@ -391,29 +712,34 @@ class Application():
 
         return 0
 
-    def _external_process(self, cmd):
-        def log_output(text):
-            for line in text.splitlines():
-                logging.debug('Subprocess output: {}'.format(line))
+    def _external_process(self, cmd, **kwargs):
+        '''Run one external program to completion. Return its output.'''
+        return self._external_processes((cmd,), **kwargs)[0]
+
+    def _external_processes(self, cmds, jobs=1, **kwargs):
+        '''Run external programs, stopping all of them at the first error.
 
+        Return their output, in order. By default, the programs are run
+        one at a time, with the timeout given on the command line.
+
+        '''
+        kwargs.setdefault('timeout', self.args.timeout)
+        runner = cbg.external.Runner(jobs=jobs, **kwargs)
         try:
-            o = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-        except FileNotFoundError:
-            s = 'External application "{}" not found.'
-            raise self.ExternalError(s.format(cmd[0]))
-        except subprocess.CalledProcessError as e:
-            logging.debug('Call {} failed.'.format(cmd))
-            log_output(e.output)
-            s = 'External application "{}" terminated with error: {}.'
-            raise self.ExternalError(s.format(cmd[0], e.returncode))
-        else:
-            logging.debug('Call {} succeeded.'.format(cmd))
-            log_output(o)
-            return o
+            return runner.run_all(((cmd, None) for cmd in cmds),
+                                  fail_fast=True)
+        except runner.Failure as e:
+            raise self.ExternalError(str(e))
+
+    def delete_old_files(self, folder, keep=()):
+        '''Use globbing to get a valid relative path.
 
-    def delete_old_files(self, folder):
-        '''Use globbing to get a valid relative path.'''
+        Files named in "keep" are spared.
+
+        '''
         for f in glob.glob(folder + '/*'):
+            if os.path.basename(f) in keep:
+                continue
             try:
                 os.remove(f)
                 logging.debug('Deleted "{}".'.format(f))
@@ -426,11 +752,14 @@ class Application():
         logging.debug('Reading specifications.')
 
         for filename_base, card_cls in self.decks.items():
-            deck = cbg.content.deck.Deck(card_cls, directory=self.folder_specs,
-                                         filename_base=filename_base)
-            deck.control_selection(self.args.whitelist, self.args.blacklist,
-                                   self.args.gallery, self.args.deck_sample)
-            yield deck
+            yield self.read_deck_spec(filename_base, card_cls)
+
+    def read_deck_spec(self, filename_base, card_cls):
+        deck = cbg.content.deck.Deck(card_cls, directory=self.folder_specs,
+                                     filename_base=filename_base)
+        deck.control_selection(self.args.whitelist, self.args.blacklist,
+                               self.args.gallery, self.args.deck_sample)
+        return deck
 
     def vectorize(self, decks):
         '''Compose SVG images and save them.
@@ -445,39 +774,139 @@ class Application():
         logging.debug('Producing vector graphics.')
 
         # Flatten specifications to a single list of cards for layouting.
-        cards = sorted(card for deck in decks for card in deck.flat())
+        cards = cbg.content.deck.flat_sorted(decks)
 
-        try:
-            os.mkdir(self.folder_svg)
-        except FileExistsError:
-            logging.debug('Destination folder for SVG already exists.')
+        if self.args.archive:
+            destination = cbg.sink.Sink.for_path(self.args.archive)
+        else:
+            destination = cbg.sink.Folder(self.folder_svg)
+            try:
+                os.mkdir(self.folder_svg)
+            except FileExistsError:
+                logging.debug('Destination folder for SVG already exists.')
 
         layouter = self.args.layouter_cls(cards,
                                           image_size=self.args.image_size,
                                           image_margins=self.args.margins,
-                                          arc=self.args.arc)
+                                          arc=self.args.arc,
+                                          jobs=self.args.jobs,
+                                          defer=self.args.watch,
+                                          stream=self.args.stream,
+                                          symbols=self.args.symbols)
         layouter.run(self.args.include_obverse, self.args.include_reverse)
 
-        title_filename = self.name_short if self.args.game_in_filename else ''
-        layouter.save(self.folder_svg,
-                      side=self.args.side_in_filename,
-                      card=self.args.card_in_filename,
-                      deck=self.args.deck_in_filename,
-                      game=title_filename,
-                      suffix=self.args.filename_suffix)
+        if self.args.incremental:
+            manifest = self.Manifest(self.folder_svg)
+        else:
+            manifest = None
+
+        with destination:
+            layouter.save(destination,
+                          digests=manifest,
+                          signatures=self._image_signatures,
+                          **self._naming())
+        logging.debug(str(cbg.svg.presenter.SVGPresenter.wrap_cache))
+
+        if self.args.watch:
+            self._image_signatures = {image.filename: (image.signature,
+                                                       image.digest)
+                                      for image in layouter}
+            self._signed_cards = layouter.cards
+
+        if manifest is not None:
+            # The new set of images is complete.
+            manifest.clear()
+            manifest.update((image.filename, image.digest)
+                            for image in layouter)
+            manifest.save()
+            self.delete_old_files(self.folder_svg, keep=manifest)
 
         return layouter
 
+    def _naming(self):
+        '''Keyword arguments for naming image files.'''
+        title_filename = self.name_short if self.args.game_in_filename else ''
+        return dict(side=self.args.side_in_filename,
+                    card=self.args.card_in_filename,
+                    deck=self.args.deck_in_filename,
+                    game=title_filename,
+                    suffix=self.args.filename_suffix)
+
     def rasterize(self, svg_filepath):
-        '''Go from vector graphics to a bitmap using Inkscape.'''
+        '''Go from vector graphics to a bitmap. Return the new filepath.'''
+        png_filepath = self.png_filepath(svg_filepath)
+        self._rasterize_pairs(((svg_filepath, png_filepath),))
+        return png_filepath
+
+    def rasterize_all(self, images):
+        '''Rasterize images in one batch, with as many jobs as requested.
+
+        Failures are collected so that each failing image is reported,
+        in a single exception raised once all jobs are done.
+
+        '''
+        pairs = [(image.filepath, self.png_filepath(image.filepath))
+                 for image in images]
+
+        if self.args.incremental:
+            self._rasterize_incrementally(images, pairs)
+        else:
+            self._rasterize_pairs(pairs)
+
+        for image, (_, png_filepath) in zip(images, pairs):
+            image.filepath = png_filepath
+
+    def _rasterize_incrementally(self, images, pairs):
+        '''Rasterize only those images whose SVG code or settings changed.
+
+        Stale bitmaps are removed only once all new ones are in place.
+
+        '''
         dpi = self.args.rasterize or self.default_dpi
-        logging.debug('Rasterizing {}.'.format(svg_filepath))
+        manifest = self.Manifest(self.folder_png)
+        new = dict()
+        pending = []
+        for image, pair in zip(images, pairs):
+            filename = os.path.basename(pair[1])
+            new[filename] = ':'.join((image.digest, str(dpi),
+                                      self.args.rasterizer))
+            if manifest.get(filename) != new[filename]:
+                pending.append(pair)
+            elif not os.path.exists(pair[1]):
+                pending.append(pair)
+
+        s = '{} of {} image(s) changed.'
+        logging.debug(s.format(len(pending), len(pairs)))
+        if pending:
+            self._rasterize_pairs(pending)
+
+        manifest.clear()
+        manifest.update(new)
+        manifest.save()
+        self.delete_old_files(self.folder_png, keep=manifest)
+
+    def _rasterize_pairs(self, pairs):
+        dpi = self.args.rasterize or self.default_dpi
+        rasterizer_cls = cbg.raster.Rasterizer.registry[self.args.rasterizer]
+        rasterizer = rasterizer_cls(dpi, jobs=self.args.jobs,
+                                    timeout=self.args.timeout)
+        if self.args.raster_cache:
+            rasterizer = cbg.raster.Cache(rasterizer, self.args.raster_cache)
+
+        logging.debug('Rasterizing {} image(s).'.format(len(pairs)))
+        errors = rasterizer.rasterize(pairs)
+
+        if errors:
+            lines = ('{}: {}'.format(*item) for item in sorted(errors.items()))
+            s = 'Failed to rasterize {} of {} image(s).\n{}'
+            raise self.ExternalError(s.format(len(errors), len(pairs),
+                                              '\n'.join(lines)))
+
+    def png_filepath(self, svg_filepath):
+        '''Name a bitmap file after an SVG file.'''
         basename = os.path.basename(svg_filepath).rpartition('.')[0]
         png_filename = '{}.png'.format(basename)
-        png_filepath = os.path.join(self.folder_png, png_filename)
-        cmd = ['inkscape', '-e', png_filepath, '-d', str(dpi), svg_filepath]
-        self._external_process(cmd)
-        return png_filepath
+        return os.path.join(self.folder_png, png_filename)
 
     def convert_to_pdf(self, filepath):
         '''Author a PDF with librsvg.'''
@@ -497,13 +926,29 @@ class Application():
         lp prints SVG as text, not graphics. Hence we use the rasterized
         forms here.
 
+        All pages are submitted in a single call to lp, as one print job
+        with one file per page, in order. Once lp has accepted the job,
+        each page is reported with the ID of the job, if lp gives one.
+        Progress of the printer itself is not tracked.
+
         '''
 
         logging.debug('Printing.')
 
-        for png in sorted(glob.glob('{}/*'.format(self.folder_png))):
-            cmd = (['lp', '-o', 'media={}'.format(self.args.print_size), png])
-            self._external_process(cmd)
+        pngs = sorted(glob.glob('{}/*'.format(self.folder_png)))
+        if not pngs:
+            logging.warning('No rasterized images to print.')
+            return
+
+        cmd = ['lp', '-o', 'media={}'.format(self.args.print_size),
+               '-t', self.name_full]
+        output = self._external_process(cmd + pngs)
+
+        match = re.search('request id is (\\S+)', output)
+        job = match.group(1) if match else 'unknown'
+        for i, png in enumerate(pngs, start=1):
+            s = 'Page {} of {} queued in print job {}: {}'
+            logging.info(s.format(i, len(pngs), job, png))
 
         # Not sure the above operation gets the scale exactly right!
         # lp seems to like printing PNGs to fill the page.
@@ -523,3 +968,17 @@ class Application():
         # margins. Perhaps this can be scripted. Apparently,
         # rasterization in GIMP can be scripted.
         # http://porpoisehead.net/mysw/index.php?pgid=gimp_svg
+
+
+def render_request(socket_path, **request):
+    '''Send a request to a rendering daemon. Return its response.
+
+    See Application.render() for the keyword arguments, and its return
+    value for the response. On failure, the response has an "error" key.
+
+    '''
+    with socket.socket(socket.AF_UNIX) as connection:
+        connection.connect(socket_path)
+        connection.sendall(json.dumps(request).encode() + b'\n')
+        with connection.makefile('rb') as f:
+            return json.loads(f.readline().decode())
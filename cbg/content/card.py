@@ -46,6 +46,7 @@ class Card(elements.DerivedFromSpec, field.Layout):
 
     def layout(self):
         '''Put data from incoming raws into empty fields.'''
+        self.forget_sorting_signature()
 
         if not self.specification:
             s = 'No specification data for the "{}" card.'
@@ -105,10 +106,31 @@ class Card(elements.DerivedFromSpec, field.Layout):
         '''
         return str(self.deck), str(self)
 
+    @property
+    def _sorting_key(self):
+        '''The sorting signature, computed once.
+
+        Finding a title is a tree search, and the signature is needed for
+        every comparison of cards, so it is kept until forgotten.
+
+        '''
+        try:
+            return self._cached_sorting_key
+        except AttributeError:
+            self._cached_sorting_key = self._sorting_signature
+            return self._cached_sorting_key
+
+    def forget_sorting_signature(self):
+        '''Clear the cached signature, after a change to salient content.'''
+        try:
+            del self._cached_sorting_key
+        except AttributeError:
+            pass
+
     def __eq__(self, other):
         '''Used for sorting (as performed by decks).'''
         try:
-            return self._sorting_signature == other._sorting_signature
+            return self._sorting_key == other._sorting_key
         except AttributeError:
             return False
 
@@ -121,7 +143,7 @@ class Card(elements.DerivedFromSpec, field.Layout):
 
         '''
         try:
-            return self._sorting_signature < other._sorting_signature
+            return self._sorting_key < other._sorting_key
         except AttributeError:
             s = 'Tried to sort {} relative to incompatible {}.'
             raise TypeError(s.format(type(self), type(other)))
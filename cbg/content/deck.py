@@ -68,15 +68,19 @@ class Deck(elements.DerivedFromSpec, collections.Counter):
         s = '{} unique card(s) in {} deck.'
         logging.debug(s.format(len(self), self))
 
-    def _parse_spec_file(self, directory):
+    @classmethod
+    def find_spec_file(cls, directory, filename_base):
+        '''Return the path to a specification file in a known format.'''
         for extension in cbg.serialization.Serialization.registry:
-            filename = '.'.join((self.filename_base, extension))
+            filename = '.'.join((filename_base, extension))
             filepath = os.path.join(directory, filename)
             if os.path.exists(filepath):
-                break
+                return filepath
+
+        raise FileNotFoundError('Could not locate {}.'.format(filename_base))
 
-        if not os.path.exists(filepath):
-            raise FileNotFoundError('Could not locate {}.'.format(self))
+    def _parse_spec_file(self, directory):
+        filepath = self.find_spec_file(directory, self.filename_base)
 
         logging.debug('Reading raw specifications from {}.'.format(filepath))
 
@@ -124,14 +128,24 @@ class Deck(elements.DerivedFromSpec, collections.Counter):
         self[card_cls(specification=card_spec, parent=self)] = copies
 
     def control_selection(self, whitelist, blacklist, card_max1, deck_max1):
+        # Each distinct restriction is parsed once, for this selection only.
+        parsed = {string: Restriction(string)
+                  for string in set(whitelist) | set(blacklist)}
+        whitelist = tuple(parsed[string] for string in whitelist)
+        blacklist = tuple(parsed[string] for string in blacklist)
         whitelist_exists = bool(whitelist)
         assert isinstance(card_max1, bool)
         assert isinstance(deck_max1, bool)
 
+        if any(r.tag is not None for r in whitelist + blacklist):
+            tag_index = self._index_tags()
+        else:
+            tag_index = None
+
         for card in self:
             whitelisted = False
             for restriction in whitelist:
-                n_restricted = self._apply_restriction(restriction, card)
+                n_restricted = restriction.apply(card, tag_index)
                 if n_restricted is not None:
                     whitelisted = True
                     # If negative: No change from default number.
@@ -143,7 +157,7 @@ class Deck(elements.DerivedFromSpec, collections.Counter):
                 self[card] = 0
 
             for restriction in blacklist:
-                n_restricted = self._apply_restriction(restriction, card)
+                n_restricted = restriction.apply(card, tag_index)
                 if n_restricted is not None:
                     if n_restricted >= 0:
                         # A not-so-black secondary filter.
@@ -163,26 +177,14 @@ class Deck(elements.DerivedFromSpec, collections.Counter):
                 elif deck_max1 is None:
                     self[card] = 0
 
-    def _apply_restriction(self, restriction, card):
-        '''See if a string specifying a restriction applies to a card.
+    def _index_tags(self):
+        '''Map the string form of each tag to the cards that have it.
 
-        If there's a hit, return the new number of copies to process.
-        Else return None.
+        Cards without a tag field are left out of the index.
 
         '''
-        interpreted = re.split('^(\d+):', restriction, maxsplit=1)[1:]
-
-        if len(interpreted) == 2:
-            # The user has supplied a copy count.
-            restricted_copies = int(interpreted[0])
-            regex = interpreted[-1]
-        else:
-            # Do not change the number of copies.
-            restricted_copies = -1
-            regex = restriction
-
-        if regex.startswith('tag='):
-            regex = regex[4:]
+        index = collections.defaultdict(set)
+        for card in self:
             try:
                 tags = card.tags
             except AttributeError:
@@ -191,11 +193,11 @@ class Deck(elements.DerivedFromSpec, collections.Counter):
                 s = ('Tag-based filtering requires "tags" property.')
                 logging.critical(s)
                 raise
-            if regex in map(str, tags):
-                return restricted_copies
-        else:
-            if re.search(regex, card.title):
-                return restricted_copies
+            except KeyError:
+                continue
+            for tag in map(str, tags):
+                index[tag].add(card)
+        return index
 
     def flat(self):
         '''Produce an iterable of all cards in the deck.
@@ -211,3 +213,60 @@ class Deck(elements.DerivedFromSpec, collections.Counter):
 
     def __str__(self):
         return str(self.title)
+
+
+def flat_sorted(decks):
+    '''Produce a sorted list of all copies of all cards in passed decks.
+
+    Unique cards are sorted before being repeated to reflect how many
+    copies exist, with the same result as sorting all copies.
+
+    '''
+    counts = collections.Counter()
+    for deck in decks:
+        for card, count in deck.items():
+            counts[card] += count
+
+    # Counters keep insertion order, so the sort is stable as before.
+    return [card for card in sorted(counts)
+            for _ in range(counts[card])]
+
+
+class Restriction():
+    '''A card selection criterion, as specified by the user.
+
+    The syntax is [AMOUNT:][tag=]REGEX.
+
+    '''
+
+    def __init__(self, string):
+        interpreted = re.split('^(\d+):', string, maxsplit=1)[1:]
+
+        if len(interpreted) == 2:
+            # The user has supplied a copy count.
+            self.copies = int(interpreted[0])
+            regex = interpreted[-1]
+        else:
+            # Do not change the number of copies.
+            self.copies = -1
+            regex = string
+
+        if regex.startswith('tag='):
+            self.tag = regex[4:]
+            self.regex = None
+        else:
+            self.tag = None
+            self.regex = re.compile(regex)
+
+    def apply(self, card, tag_index):
+        '''See if the restriction applies to a card.
+
+        If there's a hit, return the new number of copies to process.
+        Else return None. The tag index maps tag strings to sets of cards.
+
+        '''
+        if self.tag is not None:
+            if card in tag_index.get(self.tag, ()):
+                return self.copies
+        elif self.regex.search(card.title):
+            return self.copies
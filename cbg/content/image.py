@@ -19,14 +19,145 @@
 # Copyright 2014-2016 Viktor Eikman
 
 
+import collections
+import copy
 import os
 
+import numpy
+
 import cbg.misc
+import cbg.sink
 from cbg import geometry
 from cbg.svg import image
+from cbg.svg import transform
 from cbg.sample import size
 
 
+def compose_transform(element, transformation):
+    '''Apply a transformation before any already on an element.'''
+    existing = element.get('transform')
+    if existing:
+        transformation = ' '.join((transformation, existing))
+    element.set('transform', transformation)
+
+
+class Stamp():
+    '''One side of one card, drawn once in local coordinates, for copying.
+
+    Drawing a card involves layouting all of its fields, wrapping text
+    and so on. For cards with several copies, that work is done once, on
+    a scratch image, and each copy is a deep copy of the result, moved
+    into place by a translation.
+
+    The latest few stamps are kept, by card and presenter class. Copies of
+    a card are normally consecutive in layouting, though the two sides of
+    each copy may alternate, as in the Neighbours layouter.
+
+    '''
+
+    # The maximum number of stamps to keep.
+    cache_size = 8
+
+    _stamps = collections.OrderedDict()
+
+    def __init__(self, card, presenter_class):
+        self.card = card
+        self.presenter_class = presenter_class
+
+        size = card.presenter_size_override
+        if size is None:
+            size = presenter_class.size
+
+        # The scratch image collects the card's definitions.
+        self.image = image.SVG.new(dimensions=size)
+        self.presenter = presenter_class.new(card, origin=(0, 0),
+                                             parent=self.image)
+
+    @classmethod
+    def draw(cls, card, presenter_class, origin, parent):
+        '''Return a presenter, or a copy of one, drawn at origin in parent.
+
+        Presenter classes that are not reusable are instantiated afresh.
+
+        '''
+        if not presenter_class.reusable:
+            return presenter_class.new(card, origin=origin, parent=parent)
+
+        key = (id(card), presenter_class)
+        stamp = cls._stamps.get(key)
+        if stamp is None or stamp.card is not card:
+            stamp = cls._stamps[key] = cls(card, presenter_class)
+            while len(cls._stamps) > cls.cache_size:
+                cls._stamps.popitem(last=False)
+        else:
+            cls._stamps.move_to_end(key)
+        return stamp.copy(origin, parent)
+
+    def copy(self, origin, parent):
+        '''Return a new copy of the drawing, with any definitions.'''
+        for definition in self.image.defs:
+            parent.define(copy.deepcopy(definition))
+
+        # A deep copy of the presenter itself would be a plain lxml element,
+        # lacking the attributes of a presenter.
+        element = type(self.presenter)(**self.presenter.attrib)
+        element.extend(copy.deepcopy(child) for child in self.presenter)
+        element.field = self.card
+        element.parent = parent
+        element._capture_ancestors()
+        element.origin = numpy.array(origin)
+        element.size = self.presenter.size
+
+        compose_transform(element, transform.Translate(*origin).to_string())
+        return element
+
+
+class Placement():
+    '''A copy of a card assigned to a spot in an image, but not yet drawn.
+
+    Layouting needs nothing more than the footprint of each card. When
+    pages are to be rendered elsewhere, as in a process pool, layouters
+    add these stand-ins to images instead of complete presenters.
+
+    '''
+
+    def __init__(self, card, presenter_class, origin):
+        self.card = card
+        self.presenter_class = presenter_class
+        self.origin = origin
+
+        self.size = card.presenter_size_override
+        if self.size is None:
+            self.size = presenter_class.size
+
+        # Attributes to override on the eventual presenter, as when a
+        # layouter applies a transformation after the fact. Transformations
+        # are composed with any already present.
+        self.attrib = dict()
+
+    @property
+    def signature(self):
+        '''Everything that determines the presenter, for comparison.
+
+        Cards are represented by identity, on the assumption that they
+        do not change after layouting.
+
+        '''
+        return (id(self.card), self.presenter_class, tuple(self.origin),
+                tuple(sorted(self.attrib.items())))
+
+    def realize(self, parent):
+        '''Instantiate and return the presenter.'''
+        presenter = Stamp.draw(self.card, self.presenter_class, self.origin,
+                               parent)
+        for key, value in self.attrib.items():
+            if key == 'transform':
+                compose_transform(presenter, value)
+            else:
+                presenter.set(key, value)
+        return presenter
+
+
 class BaseImage():
     '''An image, treated as a file and as a container of cards.
 
@@ -51,11 +182,22 @@ class BaseImage():
         # to name the image file and describe its contents.
         self.subjects = []
 
+        # Placements to realize as presenters before saving, if any.
+        self.placements = []
+        self._rendered = False
+
         # Filenames are assigned by external forces, being dependent on
         # information unavailable to the image object itself.
         self.directory = None
         self.filename = None
 
+        # A digest of the SVG code, once saved.
+        self.digest = None
+
+        # If true, cards are saved as symbols, each instantiated by reference.
+        self.symbols = False
+        self._symbolized = False
+
     @property
     def filepath(self):
         assert self.filename and self.directory
@@ -71,11 +213,72 @@ class BaseImage():
 
     def add(self, card, xml):
         self.subjects.append(card)
-        self.xml.append(xml)
+        if isinstance(xml, Placement):
+            self.placements.append(xml)
+        else:
+            self.xml.append(xml)
+
+    @property
+    def signature(self):
+        '''A hashable summary of placements, or None without placements.
+
+        Images with equal signatures, at the same position in the same
+        run of a layouter, have the same contents.
+
+        '''
+        if not self.placements:
+            return None
+        return (type(self), tuple(self.dimensions),
+                tuple(p.signature for p in self.placements))
+
+    def render(self):
+        '''Draw any placed cards, in the order they were added.'''
+        if self._rendered:
+            return
+        for placement in self.placements:
+            self.xml.append(placement.realize(self.xml))
+        self._rendered = True
+
+    def prepare(self):
+        '''Render, and convert cards to symbols if so configured.'''
+        self.render()
+        if self.symbols and not self._symbolized:
+            self.xml.use_symbols()
+            self._symbolized = True
+
+    def tree(self):
+        '''Prune dud presenters and return the SVG element tree.'''
+        self.prepare()
+        self.xml.prune()
+        return self.xml
+
+    def serialize(self):
+        '''Prune dud presenters and return SVG code, as bytes.'''
+        return self.tree().to_string()
+
+    def save(self, previous_digest=None, sink=None):
+        '''Prune dud presenters and save SVG code to the named file.
+
+        The file is saved in a sink, by default the folder named by the
+        "directory" attribute. Return a digest of the code, as described
+        for the SVG class.
+
+        '''
+        if sink is None:
+            sink = cbg.sink.Folder(self.directory)
+        self.prepare()
+        return self.xml.save(self.filename, previous_digest=previous_digest,
+                             sink=sink)
 
-    def save(self):
-        '''Prune dud presenters and save SVG code to the named file.'''
-        self.xml.save(self.filepath)
+    def release(self):
+        '''Drop the SVG tree of a saved image, with all its presenters.
+
+        Placements are kept, being small, so the signature of the image
+        remains available. The image cannot be rendered again.
+
+        '''
+        assert self._rendered
+        self.xml = None
 
 
 class LayoutFriendlyImage(BaseImage):
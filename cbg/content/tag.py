@@ -37,6 +37,8 @@ be overridden to combine the fields for different types of tags.
 # Copyright 2014-2016 Viktor Eikman
 
 
+import bisect
+
 import cbg.misc
 import cbg.keys as keys
 from cbg.content import field
@@ -173,9 +175,11 @@ class BaseTagField(field.AutoField):
         A tag field is intended to be expandable after absorbing its
         raw specification, as part of the logic of a CBG application.
 
+        The item is inserted in place, after any equal tags, so the field
+        stays sorted without sorting it again.
+
         '''
-        super().append(item)
-        self.sort()
+        bisect.insort(self, item)
 
     def __str__(self):
         return self.as_string(self)
@@ -190,6 +194,31 @@ class AdvancedTagField(RegisteredTagField):
 
     plan = [AdvancedTag]
 
+    def __init__(self, *args, **kwargs):
+        # The contents of the field when last indexed, and an index of
+        # subordinate tags among them, sorted, by master.
+        self._hierarchy = ((), dict())
+        super().__init__(*args, **kwargs)
+
+    def _subordinates_by_master(self):
+        '''Return subordinate tags present in the field, sorted, by master.
+
+        The index is built again whenever the contents of the field have
+        changed since it was last built, through any list method.
+
+        '''
+        contents = tuple(self)
+        indexed, index = self._hierarchy
+        if contents != indexed:
+            index = dict()
+            for t in contents:
+                if t.subordinate_to:
+                    index.setdefault(t.subordinate_to, []).append(t)
+            for subordinates in index.values():
+                subordinates.sort()
+            self._hierarchy = (contents, index)
+        return index
+
     def in_spec(self):
         super().in_spec()
         for t in self:
@@ -199,12 +228,13 @@ class AdvancedTagField(RegisteredTagField):
 
     @property
     def subordinates(self):
-        return self.as_set(lambda t: t.subordinate_to)
+        return {t for subordinates in self._subordinates_by_master().values()
+                for t in subordinates}
 
     @property
     def masters(self):
         '''Tags with subordinates actually present in the field.'''
-        return {t.subordinate_to for t in self.subordinates}
+        return set(self._subordinates_by_master())
 
     def as_string(self, selection):
         '''An override.'''
@@ -212,19 +242,18 @@ class AdvancedTagField(RegisteredTagField):
 
     def _generate_strings(self, selection):
         '''Hide non-printing tags and group masters with their subordinates.'''
+        present = set(self)
+        hierarchy = self._subordinates_by_master()
+
         for t in sorted(selection):
-            if t not in self or t.subordinate_to or not t.printing:
+            if t not in present or t.subordinate_to or not t.printing:
                 continue
 
             s = str(t).capitalize()
 
-            if t in self.masters:
-                subordinate_strings = []
-                for so in self.subordinates:
-                    if so.subordinate_to == t and so.printing:
-                        subordinate_strings.append(str(so))
-                if subordinate_strings:
-                    subordinate_strings.sort()
-                    s += ' ({})'.format(', '.join(subordinate_strings))
+            subordinate_strings = [str(so) for so in hierarchy.get(t, ())
+                                   if so.printing]
+            if subordinate_strings:
+                s += ' ({})'.format(', '.join(subordinate_strings))
 
             yield s
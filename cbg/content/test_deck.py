@@ -46,3 +46,68 @@ class Deck(unittest.TestCase):
         sorted_ = [c.title for c in sorted(self.deck.flat())]
         self.assertListEqual(sorted_, [FIRST, FIRST, FIRST,
                                        SECOND, THIRD, THIRD])
+
+    def test_flat_sorted(self):
+        other = deck.Deck(type(next(iter(self.deck))),
+                          raw={'Zeroth': {}, FIRST: {}},
+                          filename_base='other')
+        decks = (self.deck, other)
+        self.assertListEqual(deck.flat_sorted(decks),
+                             sorted(card for d in decks for card in d.flat()))
+
+    def test_signature_cached(self):
+        # Once per unique card, not once per comparison of copies.
+        cls = type(next(iter(self.deck)))
+        mock = unittest.mock.PropertyMock(return_value=('d', 'x'))
+        with unittest.mock.patch.object(cls, '_sorting_signature', mock):
+            sorted(self.deck.flat())
+            sorted(self.deck.flat())
+            self.assertEqual(mock.call_count, len(self.deck))
+
+
+class Selection(unittest.TestCase):
+    def setUp(self):
+        class CardSubclass(card.Card):
+            class TitleField(cbg.content.text.TextField):
+                key = keys.TITLE
+                presenter_class_front = cbg.svg.presenter.TextPresenter
+
+            class TagField(cbg.content.tag.BaseTagField):
+                presenter_class_front = cbg.svg.presenter.TextPresenter
+
+            plan = (TitleField, TagField)
+
+        spec = {FIRST: {keys.TAGS: ['a', 'b'],
+                        keys.METADATA: {keys.COPIES: 3}},
+                SECOND: {keys.TAGS: ['b']},
+                THIRD: {keys.TAGS: []}}
+        self.deck = deck.Deck(CardSubclass, raw=spec)
+
+    def _select(self, whitelist=(), blacklist=(), card_max1=False,
+                deck_max1=False):
+        self.deck.control_selection(whitelist, blacklist, card_max1,
+                                    deck_max1)
+        return {c.title: n for c, n in self.deck.items()}
+
+    def test_title(self):
+        self.assertEqual(self._select(whitelist=['^F', '2:ond$']),
+                         {FIRST: 3, SECOND: 2, THIRD: 0})
+
+    def test_tag(self):
+        self.assertEqual(self._select(whitelist=['tag=b'],
+                                      blacklist=['1:tag=a']),
+                         {FIRST: 1, SECOND: 1, THIRD: 0})
+
+    def test_first_restriction_applies(self):
+        self.assertEqual(self._select(blacklist=['tag=a', '2:F']),
+                         {FIRST: 0, SECOND: 1, THIRD: 1})
+
+    def test_parsed_once_per_selection(self):
+        with unittest.mock.patch.object(deck, 'Restriction',
+                                        wraps=deck.Restriction) as mock:
+            self.assertEqual(self._select(whitelist=['2:tag=b', 'ir'],
+                                          blacklist=['ir']),
+                             {FIRST: 0, SECOND: 2, THIRD: 0})
+            self.assertEqual(mock.call_count, 2)
+            self._select(whitelist=['2:tag=b'], blacklist=['ir'])
+            self.assertEqual(mock.call_count, 4)
@@ -75,6 +75,65 @@ class AdvancedTag(unittest.TestCase):
         self.assertEqual(len(f.subordinates), 2)
         self.assertEqual(str(f), 'T1 (t2, t3)')
 
+    def test_hierarchy_after_append(self):
+        f = tag.AdvancedTagField(())
+        f.append(self.t3)
+        f.append(self.t2)
+        f.append(self.t1)
+        self.assertEqual(list(f), [self.t1, self.t2, self.t3])
+        self.assertEqual(f.masters, {self.t1})
+        self.assertEqual(f.subordinates, {self.t2, self.t3})
+        self.assertEqual(str(f), 'T1 (t2, t3)')
+
+    def test_hierarchy_after_remove(self):
+        f = tag.AdvancedTagField(('t1', 't2', 't3'))
+        f.remove(self.t2)
+        f.remove(self.t3)
+        self.assertEqual(len(f.masters), 0)
+        self.assertEqual(str(f), 'T1')
+
+    def test_hierarchy_after_list_methods(self):
+        def pop(f):
+            f.pop()
+
+        def delete(f):
+            del f[2]
+
+        def extend(f):
+            f.extend([self.t3])
+
+        def insert(f):
+            f.insert(0, self.t3)
+
+        def set_item(f):
+            f[1] = self.t3
+
+        def clear(f):
+            f.clear()
+
+        cases = ((pop, ('t1', 't2', 't3'), {self.t2}, 'T1 (t2)'),
+                 (delete, ('t1', 't2', 't3'), {self.t2}, 'T1 (t2)'),
+                 (extend, ('t1', 't2'), {self.t2, self.t3}, 'T1 (t2, t3)'),
+                 (insert, ('t1',), {self.t3}, 'T1 (t3)'),
+                 (set_item, ('t1', 't2'), {self.t3}, 'T1 (t3)'),
+                 (clear, ('t1', 't2'), set(), ''))
+        for mutate, spec, subordinates, string in cases:
+            with self.subTest(mutate.__name__):
+                f = tag.AdvancedTagField(spec)
+                str(f)  # Index the hierarchy before the change.
+                mutate(f)
+                self.assertEqual(f.subordinates, subordinates)
+                self.assertEqual(f.masters, {self.t1} if subordinates
+                                 else set())
+                self.assertEqual(str(f), string)
+
+    def test_selection(self):
+        t4 = tag.AdvancedTag('t4', printing=False, subordinate_to=self.t1)
+        t5 = tag.AdvancedTag('t5')
+        f = tag.AdvancedTagField(('t5', 't4', 't3', 't1'))
+        self.assertEqual(f.as_string({t5, self.t1, self.t2}), 'T1 (t3), T5')
+        self.assertIn(t4, f.subordinates)
+
 
 class Safeguards(unittest.TestCase):
     def setUp(self):
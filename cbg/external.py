@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+'''Calls to external programs, run concurrently with asyncio.'''
+
+# This file is part of CBG.
+#
+# CBG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBG.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2016 Viktor Eikman
+
+
+import asyncio
+import logging
+import subprocess
+
+
+class Runner():
+    '''A means of running external programs, with limits.
+
+    At most "jobs" programs run at a time. Each call is killed if it takes
+    more than "timeout" seconds, unless the timeout is None. Output is
+    logged line by line as it arrives, and also returned.
+
+    '''
+
+    class Failure(Exception):
+        '''Raised when an external program cannot be called, or fails.'''
+        pass
+
+    class NotFound(Failure):
+        '''Raised when an external program does not exist.
+
+        This is treated as fatal: Other calls in the same batch are
+        cancelled, since they would probably fail the same way.
+
+        '''
+        pass
+
+    class Timeout(Failure):
+        '''Raised when an external program runs out of time.'''
+        pass
+
+    def __init__(self, jobs=1, timeout=None):
+        self.jobs = jobs
+        self.timeout = timeout
+
+    def run(self, cmd, input=None):
+        '''Run an external program to completion. Return its output.'''
+        return self.run_all(((cmd, input),), fail_fast=True)[0]
+
+    def run_all(self, calls, fail_fast=False, timeouts=None):
+        '''Run external programs. Return their output in the same order.
+
+        Take an iterable of 2-tuples, each pairing a command line with
+        a string to send to the program, or None.
+
+        The optional "timeouts" argument is a sequence of limits, in
+        seconds, one for each call, overriding the runner's own. A call
+        that does more work than others, such as a batch, can thus be
+        given more time.
+
+        Where a program fails, its failure takes the place of its output.
+        With fail_fast, any failure is instead treated as fatal. A fatal
+        failure cancels all remaining calls, killing those in progress,
+        and is then raised.
+
+        '''
+        calls = tuple(calls)
+        if timeouts is None:
+            timeouts = (self.timeout,) * len(calls)
+        return asyncio.run(self._run_all(calls, tuple(timeouts), fail_fast))
+
+    async def _run_all(self, calls, timeouts, fail_fast):
+        semaphore = asyncio.Semaphore(self.jobs)
+        tasks = [asyncio.ensure_future(self._call(semaphore, cmd, input,
+                                                  timeout, fail_fast))
+                 for (cmd, input), timeout in zip(calls, timeouts)]
+        if not tasks:
+            return []
+
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        fatal = next((t for t in tasks if t.done() and not t.cancelled() and
+                      t.exception() is not None), None)
+        if fatal is not None:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise fatal.exception()
+
+        return [task.result() for task in tasks]
+
+    async def _call(self, semaphore, cmd, input, timeout, fail_fast):
+        '''Run one program. Return its output, or a non-fatal failure.'''
+        async with semaphore:
+            try:
+                return await self._execute(cmd, input, timeout)
+            except self.NotFound:
+                raise
+            except self.Failure as e:
+                if fail_fast:
+                    raise
+                return e
+
+    async def _execute(self, cmd, input, timeout):
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdin=subprocess.DEVNULL if input is None else
+                subprocess.PIPE, stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT)
+        except FileNotFoundError:
+            s = 'External application "{}" not found.'
+            raise self.NotFound(s.format(cmd[0]))
+
+        try:
+            output = await asyncio.wait_for(self._communicate(process, input),
+                                            timeout)
+        except asyncio.TimeoutError:
+            logging.debug('Call {} timed out.'.format(cmd))
+            s = 'External application "{}" timed out after {} s.'
+            raise self.Timeout(s.format(cmd[0], timeout))
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+
+        if process.returncode:
+            logging.debug('Call {} failed.'.format(cmd))
+            s = 'External application "{}" terminated with error: {}.'
+            raise self.Failure(s.format(cmd[0], process.returncode))
+
+        logging.debug('Call {} succeeded.'.format(cmd))
+        return output
+
+    async def _communicate(self, process, input):
+        '''Feed input to a process while logging its output.'''
+        async def feed():
+            if input is not None:
+                try:
+                    process.stdin.write(input.encode())
+                    await process.stdin.drain()
+                    process.stdin.close()
+                except (BrokenPipeError, ConnectionResetError):
+                    # The program quit early. Its exit status will tell.
+                    pass
+
+        async def read():
+            chunks = []
+            async for line in process.stdout:
+                text = line.decode(errors='replace')
+                logging.debug('Subprocess output: {}'.format(text.rstrip()))
+                chunks.append(text)
+            return ''.join(chunks)
+
+        _, output = await asyncio.gather(feed(), read())
+        await process.wait()
+        return output
@@ -20,13 +20,17 @@
 
 
 import collections
+import contextlib
 import itertools
 import logging
 import math
+import multiprocessing
 import re
 
 import cbg.svg.transform as transform
 import cbg.content.image
+import cbg.sink
+import cbg.svg.svg
 
 
 class Namer():
@@ -114,6 +118,32 @@ class Namer():
         return filename
 
 
+# A layouter inherited by forked worker processes. See Layouter.save().
+_forked_layouter = None
+
+# The sink of the forked layouter.
+_forked_sink = None
+
+
+def _save_forked(arguments):
+    '''Render and save one image of the forked layouter.
+
+    Return a digest of the image if the sink is shared with the parent
+    process, else the code of the image, for the parent to save.
+
+    '''
+    index, previous_digest = arguments
+    image = _forked_layouter[index]
+    if _forked_sink.shared:
+        ret = image.save(previous_digest=previous_digest, sink=_forked_sink)
+    else:
+        ret = image.serialize()
+
+    # The worker's copy of the image is no longer needed.
+    image.release()
+    return ret
+
+
 class Layouter(collections.UserList):
     '''A list of images. A manager of the SVG authoring process.
 
@@ -124,10 +154,27 @@ class Layouter(collections.UserList):
     of the images after the queue has been populated, as in the example
     application's duplex mode, implemented in this module.
 
+    With more than one job, or when deferral is requested, cards are
+    only assigned to images during layouting. Presenters are built when
+    images are saved. With more than one job, this happens in a pool of
+    worker processes, one image at a time.
+
+    In streaming mode, which implies deferral, each image is released as
+    soon as it has been saved, so that no more than one complete SVG tree
+    need be held in memory at a time. Layouting itself is cheap, so the
+    order of images can still be changed before anything is drawn.
+
+    In symbol mode, each distinct card drawing in an image is saved once,
+    as a symbol, and each copy is a reference to that symbol.
+
+    Saving with more than one job derives the IDs of definitions from
+    their contents, because counted IDs would depend on which worker
+    drew which image, and in what order.
+
     '''
 
     def __init__(self, card_list, image_size=None, image_margins=None,
-                 arc=None):
+                 arc=None, jobs=1, defer=False, stream=False, symbols=False):
         super().__init__()
 
         if not card_list:
@@ -139,6 +186,10 @@ class Layouter(collections.UserList):
         self.image_size = image_size
         self.image_margins = image_margins
         self.arc = arc
+        self.jobs = jobs
+        self.stream = stream
+        self.symbols = symbols
+        self.defer = defer or stream or jobs > 1
 
         # Predict the smallest and largest numbers cards will have.
         # This informaton can be used by subclasses, for a progress bar etc.
@@ -189,8 +240,14 @@ class Layouter(collections.UserList):
             self.new_image(card_copy, obverse)
 
         origin = self.get_origin(presenter_class.size)
-        presenter = presenter_class.new(card_copy, origin=origin,
-                                        parent=self[-1].xml)
+        if self.defer:
+            # Leave the drawing until the image is saved.
+            presenter = cbg.content.image.Placement(card_copy,
+                                                    presenter_class, origin)
+        else:
+            presenter = cbg.content.image.Stamp.draw(card_copy,
+                                                     presenter_class, origin,
+                                                     self[-1].xml)
         self.affix_copy(card_copy, number, presenter)
 
     def new_image(self, card, include_obverse):
@@ -237,11 +294,91 @@ class Layouter(collections.UserList):
             image.directory = directory
             image.filename = namer.name_image(image)
 
-    def save(self, destination_folder, **kwargs):
-        '''Save all images to named folder.'''
-        self.set_filenames(directory=destination_folder, **kwargs)
-        for image in self:
-            image.save()
+    def save(self, destination, digests=None, signatures=None, **kwargs):
+        '''Save all images to a named folder, or to a sink.
+
+        The optional "digests" argument maps filenames to digests of
+        files already in the destination. Files whose contents would not
+        change are not rewritten. The new digest of each image is
+        stored on the image.
+
+        The optional "signatures" argument maps filenames to pairs of an
+        image signature and a digest, as recorded from a previous run
+        of a deferring layouter. Images with unchanged signatures are
+        not rendered at all, if their files still exist.
+
+        '''
+        if isinstance(destination, cbg.sink.Sink):
+            sink = destination
+        else:
+            sink = cbg.sink.Folder(destination)
+        self.set_filenames(directory=sink.directory, **kwargs)
+
+        digests = digests or dict()
+        signatures = signatures or dict()
+
+        todo = []
+        for index, image in enumerate(self):
+            image.symbols = self.symbols
+            signature, digest = signatures.get(image.filename, (None, None))
+            if (signature is not None and signature == image.signature and
+                    image.filename in sink):
+                image.digest = digest
+            else:
+                todo.append((index, digests.get(image.filename)))
+
+        s = 'Rendering {} of {} image(s).'
+        logging.debug(s.format(len(todo), len(self)))
+
+        with self._id_scheme():
+            if self.jobs > 1 and len(todo) > 1:
+                self._save_in_pool(todo, sink)
+            else:
+                for index, previous_digest in todo:
+                    image = self[index]
+                    image.digest = image.save(previous_digest=previous_digest,
+                                              sink=sink)
+                    if self.stream:
+                        image.release()
+
+    @contextlib.contextmanager
+    def _id_scheme(self):
+        '''Use content-addressed IDs while saving with more than one job.'''
+        element = cbg.svg.svg.SVGElement
+        previous = element.content_addressed_ids
+        if self.jobs > 1:
+            element.content_addressed_ids = True
+        try:
+            yield
+        finally:
+            element.content_addressed_ids = previous
+
+    def _save_in_pool(self, todo, sink):
+        '''Render and save images in parallel, storing their digests.
+
+        Take a sequence of pairs of an image index and a previous digest.
+
+        Worker processes are forked, inheriting the layouter instead of
+        having it pickled, because cards refer to arbitrary classes.
+        Where the sink is not shared with them, workers return SVG code
+        instead, and it is saved here, in order, as it arrives.
+
+        '''
+        global _forked_layouter, _forked_sink
+
+        logging.debug('Saving in a pool of {} processes.'.format(self.jobs))
+        context = multiprocessing.get_context('fork')
+        _forked_layouter, _forked_sink = self, sink
+        try:
+            with context.Pool(self.jobs) as pool:
+                results = pool.imap(_save_forked, todo, chunksize=1)
+                for (index, previous_digest), result in zip(todo, results):
+                    if not sink.shared:
+                        result = sink.put(self[index].filename, result,
+                                          previous_digest=previous_digest)
+                    self[index].digest = result
+        finally:
+            _forked_layouter = _forked_sink = None
 
 
 class Neighbours(Layouter):
@@ -274,7 +411,8 @@ class Duplex(Layouter):
         # Alternate between front sheets and back sheets.
         midpoint = len(self) // 2
         tmp = []
-        for pair in zip(self[:midpoint], self[midpoint:]):
+        # Slicing self would produce new, empty layouters.
+        for pair in zip(self.data[:midpoint], self.data[midpoint:]):
             tmp.extend(pair)
         self.data = tmp
 
@@ -390,8 +528,11 @@ class Fan(Layouter):
         # SVG doesn't handle radians.
         angle = math.degrees(self._n_angle(card_number))
         rotation = transform.Rotate(angle, x=self.pivot[0], y=self.pivot[1])
-        # Override whatever other transformations are applied.
-        presenter.attrib['transform'] = rotation.to_string()
+        if isinstance(presenter, cbg.content.image.Placement):
+            presenter.attrib['transform'] = rotation.to_string()
+        else:
+            cbg.content.image.compose_transform(presenter,
+                                                rotation.to_string())
 
         super().affix_copy(card, card_number, presenter)
 
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+'''Conversion of SVG images to bitmaps through external programs.'''
+
+# This file is part of CBG.
+#
+# CBG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBG.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2016 Viktor Eikman
+
+
+###########
+# IMPORTS #
+###########
+
+
+import hashlib
+import logging
+import os
+import shlex
+import shutil
+import tempfile
+
+import cbg.external
+
+
+#####################
+# INTERFACE CLASSES #
+#####################
+
+
+class Rasterizer():
+    '''Abstract base class for a means of producing PNG from SVG files.
+
+    A rasterizer is handed every image of a run at once, so that
+    implementations can spread the startup cost of an external program
+    over the whole batch.
+
+    Implementations are registered by name, for selection on the command
+    line. Use the register() class method as a decorator on new ones.
+
+    '''
+
+    registry = dict()
+
+    # A short name for use on the command line.
+    name = None
+
+    # Raised when an external program cannot be called, or fails.
+    Failure = cbg.external.Runner.Failure
+
+    def __init__(self, dpi, jobs=1, timeout=None):
+        self.dpi = dpi
+
+        # The maximum number of external processes to run at a time.
+        self.jobs = jobs
+
+        # The maximum number of seconds per image, if any. A process
+        # handling a batch of images gets this much time for each.
+        self.timeout = timeout
+
+        self.runner = cbg.external.Runner(jobs=jobs, timeout=timeout)
+
+    @classmethod
+    def register(cls, subclass):
+        cls.registry[subclass.name] = subclass
+        return subclass
+
+    def rasterize(self, pairs):
+        '''Produce PNG files.
+
+        Take an iterable of 2-tuples, each pairing an existing SVG
+        filepath with a PNG filepath to write.
+
+        Existing PNG files are removed first. Stale output would mask
+        failure, and an external program writing in place would also
+        write to any file hard-linked to the old one, as by a Cache.
+
+        Return a dictionary of error messages by SVG filepath, for those
+        images that could not be rasterized. An empty dictionary means
+        that all went well.
+
+        '''
+        pairs = list(pairs)
+        for _, png_filepath in pairs:
+            if os.path.exists(png_filepath):
+                os.remove(png_filepath)
+        return self.convert(pairs)
+
+    def convert(self, pairs):
+        '''Produce PNG files, as for rasterize(), to fresh filepaths.
+
+        Take a list of pairs. To be overridden.
+
+        '''
+        raise NotImplementedError
+
+    def _run_all(self, pairs, calls):
+        '''Run external programs for groups of images. Return errors.
+
+        Each call is a 2-tuple of a command line and its input, or None.
+        Each corresponds to a list of pairs of filepaths. The timeout of
+        each call is scaled by the length of its list. If a call fails,
+        all of its images are reported, each with the same message. If
+        it is fatal, all images are reported.
+
+        '''
+        pairs = list(pairs)
+        timeouts = None
+        if self.timeout is not None:
+            timeouts = [self.timeout * len(group) for group in pairs]
+
+        errors = dict()
+        try:
+            results = self.runner.run_all(calls, timeouts=timeouts)
+        except self.Failure as e:
+            results = [e] * len(pairs)
+
+        for group, result in zip(pairs, results):
+            if isinstance(result, self.Failure):
+                errors.update((svg, str(result)) for svg, _ in group)
+        return errors
+
+
+class OneShot(Rasterizer):
+    '''A rasterizer that starts its external program once per image.'''
+
+    def command(self, svg_filepath, png_filepath):
+        '''Return a command line for rasterizing a single image.'''
+        raise NotImplementedError
+
+    def convert(self, pairs):
+        '''An override.'''
+        return self._run_all([[pair] for pair in pairs],
+                             [(self.command(*pair), None) for pair in pairs])
+
+
+@Rasterizer.register
+class Inkscape(OneShot):
+    '''One Inkscape process per image.'''
+
+    name = 'inkscape'
+
+    def command(self, svg_filepath, png_filepath):
+        return ['inkscape', '-e', png_filepath, '-d', str(self.dpi),
+                svg_filepath]
+
+
+@Rasterizer.register
+class InkscapeShell(Rasterizer):
+    '''Long-lived Inkscape processes, fed images through shell mode.
+
+    Images are shared out evenly between as many processes as there are
+    jobs. In shell mode, Inkscape does not report errors for individual
+    images, so failure is inferred from missing output files.
+
+    '''
+
+    name = 'inkscape-shell'
+
+    def convert(self, pairs):
+        '''An override.'''
+        n_processes = max(1, min(self.jobs, len(pairs)))
+        batches = [pairs[i::n_processes] for i in range(n_processes)]
+
+        errors = self._run_all(batches, map(self._batch_call, batches))
+        for svg_filepath, png_filepath in pairs:
+            if svg_filepath not in errors and not os.path.exists(png_filepath):
+                errors[svg_filepath] = 'No output from Inkscape shell.'
+        return errors
+
+    def _batch_call(self, batch):
+        '''Return a call to one Inkscape process, for a batch of images.'''
+        lines = ('{} -e {} -d {}\n'.format(shlex.quote(svg_filepath),
+                                           shlex.quote(png_filepath),
+                                           self.dpi)
+                 for svg_filepath, png_filepath in batch)
+        return ['inkscape', '--shell'], ''.join(lines) + 'quit\n'
+
+
+@Rasterizer.register
+class RSVGConvert(OneShot):
+    '''One librsvg process per image.'''
+
+    name = 'rsvg-convert'
+
+    def command(self, svg_filepath, png_filepath):
+        dpi = str(self.dpi)
+        return ['rsvg-convert', '-f', 'png', '-d', dpi, '-p', dpi,
+                '-o', png_filepath, svg_filepath]
+
+
+class Cache():
+    '''A persistent store of bitmaps, wrapping a rasterizer.
+
+    Bitmaps are filed under a digest of the SVG code they were made
+    from, together with the resolution and the name of the rasterizer.
+    Images already in the cache are hard-linked, or else copied, to
+    their destination instead of being rasterized again.
+
+    '''
+
+    def __init__(self, rasterizer, directory):
+        self.rasterizer = rasterizer
+        self.directory = directory
+
+    def key(self, svg_filepath):
+        '''Return a digest identifying the bitmap for an SVG file.'''
+        h = hashlib.sha256()
+        with open(svg_filepath, mode='rb') as f:
+            h.update(f.read())
+        h.update('{}:{}'.format(self.rasterizer.dpi,
+                                self.rasterizer.name).encode())
+        return h.hexdigest()
+
+    def filepath(self, key):
+        return os.path.join(self.directory, key[:2], key + '.png')
+
+    def rasterize(self, pairs):
+        '''As for a rasterizer. Take from and add to the cache.'''
+        pending = []
+        for svg_filepath, png_filepath in pairs:
+            key = self.key(svg_filepath)
+            cached = self.filepath(key)
+            if os.path.exists(cached):
+                logging.debug('Cached bitmap for {}.'.format(svg_filepath))
+                self._install(cached, png_filepath)
+            else:
+                pending.append((svg_filepath, png_filepath, key))
+
+        s = '{} of {} image(s) not in raster cache.'
+        logging.debug(s.format(len(pending), len(pairs)))
+
+        # The rasterizer removes links to the cache before writing.
+        errors = self.rasterizer.rasterize([p[:2] for p in pending])
+        for svg_filepath, png_filepath, key in pending:
+            if svg_filepath not in errors:
+                self._store(png_filepath, self.filepath(key))
+        return errors
+
+    def _install(self, cached, png_filepath):
+        if os.path.exists(png_filepath):
+            os.remove(png_filepath)
+        try:
+            os.link(cached, png_filepath)
+        except OSError:
+            # Not supported, or across file systems.
+            shutil.copyfile(cached, png_filepath)
+
+    def _store(self, png_filepath, cached):
+        '''Copy a bitmap into the cache, atomically.'''
+        directory = os.path.dirname(cached)
+        os.makedirs(directory, exist_ok=True)
+        handle, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        os.close(handle)
+        try:
+            shutil.copyfile(png_filepath, tmp)
+            os.replace(tmp, cached)
+        except:
+            os.remove(tmp)
+            raise
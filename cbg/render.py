@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+'''Rendering in memory, for use of CBG as a library.
+
+The application module works through a command-line interface and
+folders of files. The functions here take the same card classes and
+options as arguments, and return rendered pages instead of saving them.
+
+'''
+
+# This file is part of CBG.
+#
+# CBG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBG.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2016 Viktor Eikman
+
+
+import collections
+import re
+
+import cbg.content.deck
+import cbg.layout
+import cbg.serialization
+from cbg.sample import size
+
+
+# Layouters by name, as in the command-line interface.
+LAYOUTERS = {'default': cbg.layout.Layouter,
+             'duplex': cbg.layout.Duplex,
+             'neighbours': cbg.layout.Neighbours,
+             'fan': cbg.layout.Fan,
+             'singles': cbg.layout.Singles}
+
+# Sides of cards by name, as pairs of Booleans: obverse and reverse.
+SIDES = {'obverse': (True, False),
+         'reverse': (False, True),
+         'both': (True, True)}
+
+
+def read_decks(decks, specs=None, folder_specs=None, whitelist=(),
+               blacklist=(), card_max1=False, deck_max1=False):
+    '''Return a list of decks.
+
+    The "decks" argument is a dictionary of card type classes indexed by
+    file name strings, as for the Application class. "specs" optionally
+    maps the same strings to specification data, already deserialized,
+    or to the paths of specification files. Decks missing from "specs"
+    are read from "folder_specs".
+
+    The remaining arguments restrict the selection of cards, as the
+    corresponding command-line arguments do.
+
+    '''
+    specs = specs or dict()
+    ret = []
+    for filename_base, card_cls in decks.items():
+        raw = specs.get(filename_base)
+        if isinstance(raw, str):
+            raw = cbg.serialization.Serialization.load(raw)
+        elif raw is None and folder_specs is None:
+            s = 'No specification for deck "{}".'
+            raise ValueError(s.format(filename_base))
+        deck = cbg.content.deck.Deck(card_cls, raw=raw,
+                                     directory=folder_specs,
+                                     filename_base=filename_base)
+        deck.control_selection(whitelist, blacklist, card_max1, deck_max1)
+        ret.append(deck)
+    return ret
+
+
+def lay_out(decks, layouter='default', side='obverse', title=None,
+            naming=None, image_size=size.A4, image_margins=size.A4_MARGINS,
+            **kwargs):
+    '''Lay out cards from deck objects. Return a layouter.
+
+    The layouter is a class, or a key to LAYOUTERS, and the side a key to
+    SIDES. Both sides are always included by layouters that pair them.
+    If a title is given, it is a regular expression, and only cards with
+    matching titles are included.
+
+    Images are named, using "naming" as keyword arguments to the Namer,
+    but neither drawn nor saved. Other keyword arguments are passed to
+    the layouter.
+
+    '''
+    cards = cbg.content.deck.flat_sorted(decks)
+    if title is not None:
+        regex = re.compile(title)
+        cards = [card for card in cards if regex.search(card.title)]
+
+    if isinstance(layouter, str):
+        try:
+            layouter = LAYOUTERS[layouter]
+        except KeyError:
+            raise ValueError('Unknown layouter: {}.'.format(layouter))
+    try:
+        obverse, reverse = SIDES[side]
+    except KeyError:
+        raise ValueError('Unknown side: {}.'.format(side))
+    if issubclass(layouter, (cbg.layout.Duplex, cbg.layout.Neighbours)):
+        obverse = reverse = True
+
+    images = layouter(cards, image_size=image_size,
+                      image_margins=image_margins, **kwargs)
+    images.run(obverse, reverse)
+    images.set_filenames(**(naming or dict()))
+    return images
+
+
+def render(decks, specs=None, folder_specs=None, selection=None,
+           trees=False, **kwargs):
+    '''Render pages. Return an ordered dictionary of them, by filename.
+
+    Each page is SVG code, as bytes, or with "trees", an lxml element
+    tree. The "decks", "specs" and "folder_specs" arguments are as for
+    read_decks(), and "selection" is a dictionary of its other keyword
+    arguments. Further keyword arguments are passed to lay_out().
+
+    Nothing is written to disk.
+
+    '''
+    deck_objects = read_decks(decks, specs=specs, folder_specs=folder_specs,
+                              **(selection or dict()))
+    images = lay_out(deck_objects, **kwargs)
+    if trees:
+        return collections.OrderedDict((image.filename, image.tree())
+                                       for image in images)
+    return collections.OrderedDict((image.filename, image.serialize())
+                                   for image in images)
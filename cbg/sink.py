@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+'''Destinations for saved images: folders, memory and archives.'''
+
+# This file is part of CBG.
+#
+# CBG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBG.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2016 Viktor Eikman
+
+
+###########
+# IMPORTS #
+###########
+
+
+import collections
+import hashlib
+import io
+import os
+import sys
+import tarfile
+import time
+import zipfile
+
+
+#####################
+# INTERFACE CLASSES #
+#####################
+
+
+class Sink():
+    '''Abstract base class for a destination of files, named but not nested.
+
+    A sink is a context manager. Archives are completed when it is closed.
+
+    Implementations are registered by filename suffix, for selection from
+    a path. Use the register() class method as a decorator on new ones.
+
+    '''
+
+    registry = dict()
+
+    # Filename suffixes of archives written by an implementation.
+    suffixes = ()
+
+    # True if files written by forked processes reach the sink. Else,
+    # the code of each file must be sent back to the parent process.
+    shared = False
+
+    # The folder of files in the sink, if they are in the file system.
+    directory = None
+
+    @classmethod
+    def register(cls, subclass):
+        for suffix in subclass.suffixes:
+            cls.registry[suffix] = subclass
+        return subclass
+
+    @classmethod
+    def for_path(cls, path):
+        '''Return a new sink for a path, chosen by its suffix.
+
+        A hyphen stands for standard output, as a stream of tar format.
+        A path without a registered suffix is treated as a folder.
+
+        '''
+        if path == '-':
+            return TarStream()
+        suffix = os.path.splitext(path)[1].lower()
+        try:
+            return cls.registry[suffix](path)
+        except KeyError:
+            return Folder(path)
+
+    def __contains__(self, filename):
+        '''True if a file of the given name is already in the sink.'''
+        return False
+
+    def put(self, filename, code, previous_digest=None):
+        '''Add a file to the sink. Return a hexadecimal digest of its code.
+
+        If the digest matches the "previous_digest" argument and the file
+        is already in the sink, it is not rewritten.
+
+        '''
+        digest = hashlib.sha256(code).hexdigest()
+        if digest != previous_digest or filename not in self:
+            self.write(filename, code)
+        return digest
+
+    def write(self, filename, code):
+        '''Write bytes to a file in the sink.'''
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+##################
+# IMPLEMENTATION #
+##################
+
+
+class Folder(Sink):
+    '''A directory in the file system, one file per image.'''
+
+    shared = True
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def __contains__(self, filename):
+        return os.path.exists(self.path(filename))
+
+    def write(self, filename, code):
+        with open(self.path(filename), mode='bw') as f:
+            f.write(code)
+
+
+class Memory(Sink, collections.OrderedDict):
+    '''An ordered dictionary of file contents, as bytes, by filename.'''
+
+    def __contains__(self, filename):
+        return collections.OrderedDict.__contains__(self, filename)
+
+    def write(self, filename, code):
+        self[filename] = code
+
+
+@Sink.register
+class ZipArchive(Sink):
+    '''A compressed zip archive, written to a path or a binary file object.'''
+
+    suffixes = ('.zip',)
+
+    def __init__(self, file):
+        self.archive = zipfile.ZipFile(file, mode='w',
+                                       compression=zipfile.ZIP_DEFLATED)
+
+    def __contains__(self, filename):
+        return filename in self.archive.NameToInfo
+
+    def write(self, filename, code):
+        self.archive.writestr(filename, code)
+
+    def close(self):
+        self.archive.close()
+
+
+@Sink.register
+class TarStream(Sink):
+    '''An uncompressed tar archive, written as a stream.
+
+    The destination is a path, or a binary file object, by default
+    standard output. It need not be seekable, so output can be piped
+    to another process as it is produced.
+
+    '''
+
+    suffixes = ('.tar',)
+
+    def __init__(self, file=None):
+        if file is None:
+            file = sys.stdout.buffer
+        if isinstance(file, str):
+            self.archive = tarfile.open(file, mode='w|')
+        else:
+            self.archive = tarfile.open(fileobj=file, mode='w|')
+        self._names = set()
+
+    def __contains__(self, filename):
+        return filename in self._names
+
+    def write(self, filename, code):
+        info = tarfile.TarInfo(filename)
+        info.size = len(code)
+        info.mtime = time.time()
+        self.archive.addfile(info, io.BytesIO(code))
+        self._names.add(filename)
+
+    def close(self):
+        self.archive.close()
@@ -19,9 +19,15 @@
 # Copyright 2014-2016 Viktor Eikman
 
 
+import hashlib
+import logging
+import os
+
 import lxml
 
 import cbg.misc
+import cbg.sink
+from cbg.svg import misc
 from cbg.svg import svg
 from cbg.sample import size
 
@@ -81,16 +87,139 @@ class SVG(cbg.misc.SearchableTree, svg.SVGElement):
         '''Convenient access to the top-level defs container.'''
         return self.find('defs')
 
+    def define(self, xml):
+        '''Take an etree oject. Add as a definition if new, else ignore.
+
+        A content-addressed ID is derived again here, in case contents were
+        added after it was set. Refer to a definition by its ID only after
+        defining it.
+
+        '''
+        if isinstance(xml, svg.SVGElement):
+            id_ = xml.refresh_id()
+        else:
+            id_ = xml.get('id')
+
+        if id_ is None:
+            s = 'Definitions must have an "id" attribute set. "{}" does not.'
+            raise ValueError(s.format(lxml.etree.tostring(xml)))
+
+        # Avoid duplicates by ID, to keep the SVG clean.
+        index = self._definition_index()
+        element = index.get(id_)
+        if element is not None:
+            # Compare elements by structure. Serialization with
+            # etree.tostring would not do, because it includes the
+            # namespace map inherited by elements already in the tree.
+            if svg.canonical_form(element) == svg.canonical_form(xml):
+                logging.debug('Excluding duplicate definition.')
+                return
+            else:
+                s = 'Existing: {}'.format(lxml.etree.tostring(element))
+                logging.error(s)
+                s = 'Proposed: {}'.format(lxml.etree.tostring(xml))
+                logging.error(s)
+                s = 'Dissimilar definitions with shared ID ({}).'
+                raise ValueError(s.format(id_))
+
+        self.defs.append(xml)
+        self._index_definition(index, xml)
+        self._definitions = (index, xml)
+
+    def _definition_index(self):
+        '''Return a dictionary of elements in the defs, by ID.
+
+        The index is built on first use. On later use, definitions that
+        were appended to the defs directly since then are added to it,
+        working backwards from the last one. It is an attribute of the
+        Python proxy, and is rebuilt if lxml replaces the proxy, or if
+        the last definition indexed has been removed.
+
+        '''
+        defs = self.defs
+        try:
+            index, last = self._definitions
+        except AttributeError:
+            index, last = dict(), None
+
+        try:
+            newest = defs[-1]
+        except IndexError:
+            newest = None
+
+        if newest is not last:
+            new = []
+            element = newest
+            while element is not None and element is not last:
+                new.append(element)
+                element = element.getprevious()
+            if element is None and last is not None:
+                # The last definition indexed is gone. Start over.
+                index, new = dict(), list(defs)
+            else:
+                new.reverse()
+            for element in new:
+                self._index_definition(index, element)
+            self._definitions = (index, newest)
+
+        return index
+
+    def _index_definition(self, index, element):
+        for descendant in element.iter():
+            id_ = descendant.get('id')
+            if id_ is not None:
+                index.setdefault(id_, descendant)
+
+    def use_symbols(self):
+        '''Replace each top-level group with a reference to a symbol.
+
+        Groups that differ only in their transformation, such as copies
+        of one card, share a symbol. Symbols are identified by a digest
+        of their contents.
+
+        '''
+        for group in self.findall('g'):
+            transformation = group.attrib.pop('transform', None)
+            code = lxml.etree.tostring(group)
+            id_ = 's' + hashlib.sha256(code).hexdigest()[:16]
+
+            use = misc.Use.new(id_)
+            if transformation:
+                use.set('transform', transformation)
+            self.replace(group, use)
+
+            # Duplicates are discarded by define().
+            self.define(misc.Symbol.new(id=id_, overflow='visible',
+                                        children=(group,)))
+
     def to_string(self):
         return lxml.etree.tostring(self, pretty_print=True)
 
-    def save(self, filepath):
-        '''Prune dud presenters and save SVG code to the named file.'''
+    def prune(self):
+        '''Remove dud presenters: empty elements without attributes.'''
         for element in self.iter():
             if element == self:
                 continue
             if not len(element) and not element.text and not element.attrib:
                 element.getparent().remove(element)
 
-        with open(filepath, mode='bw') as f:
-            f.write(self.to_string())
+    def serialize(self):
+        '''Prune dud presenters and return SVG code, as bytes.'''
+        self.prune()
+        return self.to_string()
+
+    def save(self, filepath, previous_digest=None, sink=None):
+        '''Prune dud presenters and save SVG code.
+
+        By default, the code is saved to a file at the named path. With a
+        sink, the path is instead the name of a file in that sink.
+
+        Return a hexadecimal digest of the SVG code. If this matches the
+        "previous_digest" argument and the file exists, it is not rewritten.
+
+        '''
+        if sink is None:
+            sink = cbg.sink.Folder(os.path.dirname(filepath))
+            filepath = os.path.basename(filepath)
+        return sink.put(filepath, self.serialize(),
+                        previous_digest=previous_digest)
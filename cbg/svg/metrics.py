@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+'''Font metrics, for measuring and wrapping text.'''
+
+# This file is part of CBG.
+#
+# CBG is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# CBG is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with CBG.  If not, see <http://www.gnu.org/licenses/>.
+#
+# Copyright 2014-2016 Viktor Eikman
+
+
+import bisect
+import functools
+import itertools
+import os
+import re
+import struct
+
+
+class Metrics():
+    '''The advance widths of the glyphs in one face of a font.
+
+    Widths are stored in ems, i.e. as fractions of the font size.
+    Kerning is not taken into account.
+
+    '''
+
+    class Unreadable(Exception):
+        '''Raised when a font file cannot be parsed.'''
+        pass
+
+    def __init__(self, widths, default=None):
+        '''Take a dictionary of advance widths by character.
+
+        The default is used for characters missing from the dictionary.
+        It defaults to the mean width of the characters present.
+
+        '''
+        self.widths = widths
+        if default is None:
+            default = sum(widths.values()) / len(widths) if widths else 0.5
+        self.default = default
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def from_file(cls, filepath):
+        '''Load metrics from an AFM, TrueType or OpenType file. Cached.'''
+        if os.path.splitext(filepath)[1].lower() == '.afm':
+            with open(filepath, encoding='latin-1') as f:
+                return cls.from_afm(f.read())
+        with open(filepath, mode='rb') as f:
+            return cls.from_sfnt(f.read())
+
+    @classmethod
+    def from_afm(cls, code):
+        '''Parse Adobe Font Metrics, as a string.
+
+        Glyphs are identified by their character codes, interpreted as
+        Latin-1, or by names of the form "uniXXXX". Glyphs without a
+        horizontal width are skipped.
+
+        '''
+        widths = dict()
+        in_metrics = False
+        for line in code.splitlines():
+            if line.startswith('StartCharMetrics'):
+                in_metrics = True
+            elif line.startswith('EndCharMetrics'):
+                break
+            elif in_metrics and line.strip():
+                try:
+                    cls._afm_character(line, widths)
+                except ValueError as e:
+                    s = 'Malformed character metrics "{}": {}'
+                    raise cls.Unreadable(s.format(line, e))
+
+        if not widths:
+            raise cls.Unreadable('No character metrics in AFM.')
+        return cls(widths)
+
+    @staticmethod
+    def _afm_character(line, widths):
+        '''Add the width of a glyph from one line of AFM character metrics.'''
+        fields = dict(f.strip().split(None, 1)
+                      for f in line.split(';') if f.strip())
+        if 'WX' not in fields:
+            return
+        width = float(fields['WX']) / 1000
+        match = re.fullmatch('uni([0-9A-F]{4})', fields.get('N', ''))
+        if match:
+            widths[chr(int(match.group(1), 16))] = width
+        elif 0 <= int(fields.get('C', -1)) < 256:
+            widths[chr(int(fields['C']))] = width
+
+    @classmethod
+    def from_sfnt(cls, data):
+        '''Parse a TrueType or OpenType font file, as bytes.
+
+        Only the "head", "hhea", "hmtx" and "cmap" tables are read.
+        Font collections are not supported.
+
+        '''
+        try:
+            tables = cls._sfnt_tables(data)
+            units_per_em = struct.unpack_from('>H', data,
+                                              tables[b'head'] + 18)[0]
+            n_metrics = struct.unpack_from('>H', data,
+                                           tables[b'hhea'] + 34)[0]
+            advances = struct.unpack_from('>' + 'Hh' * n_metrics, data,
+                                          tables[b'hmtx'])[::2]
+            glyphs = cls._sfnt_cmap(data, tables[b'cmap'])
+            if not units_per_em or not n_metrics:
+                raise ValueError('No horizontal metrics.')
+        except (KeyError, ValueError, OverflowError, struct.error) as e:
+            s = 'Unsupported or damaged font file: {}'
+            raise cls.Unreadable(s.format(repr(e)))
+
+        widths = dict()
+        for character, glyph in glyphs.items():
+            # Glyphs past the last metric share its advance width.
+            advance = advances[min(glyph, n_metrics - 1)]
+            widths[character] = advance / units_per_em
+        return cls(widths)
+
+    @staticmethod
+    def _sfnt_tables(data):
+        '''Return a dictionary of table offsets by tag.'''
+        n_tables = struct.unpack_from('>H', data, 4)[0]
+        tables = dict()
+        for i in range(n_tables):
+            tag, _, offset, _ = struct.unpack_from('>4sIII', data, 12 + 16 * i)
+            tables[tag] = offset
+        return tables
+
+    @staticmethod
+    def _sfnt_cmap(data, cmap):
+        '''Return a dictionary of glyph indices by character.
+
+        Unicode subtables in format 12 are preferred over format 4.
+
+        '''
+        n_subtables = struct.unpack_from('>H', data, cmap + 2)[0]
+        candidates = dict()
+        for i in range(n_subtables):
+            platform, encoding, offset = struct.unpack_from('>HHI', data,
+                                                            cmap + 4 + 8 * i)
+            if platform == 0 or (platform == 3 and encoding in (1, 10)):
+                subtable = cmap + offset
+                format_ = struct.unpack_from('>H', data, subtable)[0]
+                candidates.setdefault(format_, subtable)
+
+        glyphs = dict()
+        if 12 in candidates:
+            subtable = candidates[12]
+            n_groups = struct.unpack_from('>I', data, subtable + 12)[0]
+            for i in range(n_groups):
+                start, end, glyph = struct.unpack_from('>III', data,
+                                                       subtable + 16 + 12 * i)
+                for code in range(start, end + 1):
+                    glyphs[chr(code)] = glyph + code - start
+        elif 4 in candidates:
+            subtable = candidates[4]
+            n_segments = struct.unpack_from('>H', data, subtable + 6)[0] // 2
+            base = subtable + 14
+            ends = struct.unpack_from('>{}H'.format(n_segments), data, base)
+            base += 2 * n_segments + 2
+            starts = struct.unpack_from('>{}H'.format(n_segments), data, base)
+            base += 2 * n_segments
+            deltas = struct.unpack_from('>{}h'.format(n_segments), data, base)
+            base += 2 * n_segments
+            range_offsets = struct.unpack_from('>{}H'.format(n_segments),
+                                               data, base)
+            for i, (start, end) in enumerate(zip(starts, ends)):
+                for code in range(start, min(end, 0xFFFE) + 1):
+                    if range_offsets[i]:
+                        address = (base + 2 * i + range_offsets[i] +
+                                   2 * (code - start))
+                        glyph = struct.unpack_from('>H', data, address)[0]
+                        if glyph:
+                            glyph = (glyph + deltas[i]) % 65536
+                    else:
+                        glyph = (code + deltas[i]) % 65536
+                    if glyph:
+                        glyphs[chr(code)] = glyph
+        else:
+            raise KeyError('No supported Unicode character map.')
+        return glyphs
+
+    def scaled(self, factor):
+        '''Return a copy with all widths multiplied by factor.'''
+        return type(self)({k: v * factor for k, v in self.widths.items()},
+                          default=self.default * factor)
+
+    def width(self, text):
+        '''Return the width of a string, in ems.'''
+        get = self.widths.get
+        return sum(get(c, self.default) for c in text)
+
+    def prefix_sums(self, text):
+        '''Return the widths of each prefix of a string, from the empty one.'''
+        get = self.widths.get
+        return [0] + list(itertools.accumulate(get(c, self.default)
+                                               for c in text))
+
+    def wrap(self, text, width, initial_indent='', subsequent_indent=''):
+        '''Break text into lines no wider than width, measured in ems.
+
+        Like textwrap.wrap(), with whitespace collapsed. Words too long to
+        fit a line on their own are broken between characters. Each line
+        is measured by subtraction from the prefix sums of the text.
+
+        '''
+        words = text.split()
+        if not words:
+            return []
+
+        text = ' '.join(words)
+        sums = self.prefix_sums(text)
+        indents = (initial_indent, subsequent_indent)
+        indent_widths = tuple(map(self.width, indents))
+
+        lines = []
+        start = None  # Index of the first character of the current line.
+        end = 0
+
+        def indentation():
+            return 0 if not lines else 1
+
+        for word in words:
+            word_start = text.index(word, end)
+            word_end = word_start + len(word)
+            if start is not None:
+                room = width - indent_widths[indentation()]
+                if sums[word_end] - sums[start] <= room:
+                    end = word_end
+                    continue
+                lines.append(indents[indentation()] + text[start:end])
+
+            # Start a new line, breaking the word if it cannot fit.
+            start = word_start
+            room = width - indent_widths[indentation()]
+            while sums[word_end] - sums[start] > room:
+                limit = sums[start] + room
+                cut = max(bisect.bisect_right(sums, limit) - 1, start + 1)
+                lines.append(indents[indentation()] + text[start:cut])
+                start = cut
+                room = width - indent_widths[indentation()]
+            end = word_end
+
+        lines.append(indents[indentation()] + text[start:end])
+        return lines
@@ -62,3 +62,18 @@ class Mask(svg.IDElement):
 class ClipPath(svg.IDElement):
     TAG = 'clipPath'
     _id_prefix = 'cP'
+
+
+class Symbol(svg.SVGElement):
+    '''A template for instantiation by use elements.'''
+    TAG = 'symbol'
+
+
+class Use(svg.SVGElement):
+    '''An instance of a symbol or other element, by reference to its ID.'''
+    TAG = 'use'
+
+    @classmethod
+    def new(cls, id_, **kwargs):
+        kwargs['{{{}}}href'.format(svg.NAMESPACE_XLINK)] = '#' + id_
+        return super().new(**kwargs)
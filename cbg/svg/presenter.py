@@ -19,10 +19,10 @@
 # Copyright 2014-2016 Viktor Eikman
 
 
+import collections
 import textwrap
 import logging
 
-import lxml.etree
 import numpy
 
 import cbg.cursor
@@ -37,6 +37,56 @@ RECURSION_FRONT = 'presenter_class_front'
 RECURSION_BACK = 'presenter_class_back'
 
 
+class WrapCache():
+    '''A bounded cache of wrapped lines of text, least recently used first.
+
+    Keys should cover everything that affects the result of wrapping:
+    Text, width, indentation and font metrics. Hits and misses are counted
+    for tuning the maximum size.
+
+    '''
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._lines = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._lines)
+
+    def __str__(self):
+        s = 'Wrap cache: {} hits, {} misses ({:.0%} hit rate), {}/{} entries.'
+        return s.format(self.hits, self.misses, self.hit_rate, len(self),
+                        self.maxsize)
+
+    @property
+    def hit_rate(self):
+        '''The proportion of lookups answered from the cache.'''
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+    def lookup(self, key, function):
+        '''Return a new list of lines, calling function on a cache miss.'''
+        try:
+            lines = self._lines[key]
+        except KeyError:
+            self.misses += 1
+            lines = self._lines[key] = tuple(function())
+            if len(self._lines) > self.maxsize:
+                self._lines.popitem(last=False)
+        else:
+            self.hits += 1
+            self._lines.move_to_end(key)
+        return list(lines)
+
+    def clear(self):
+        '''Empty the cache and reset its counters.'''
+        self._lines.clear()
+        self.hits = 0
+        self.misses = 0
+
+
 class SVGPresenter(cbg.misc.SearchableTree, svg.SVGElement):
     '''An abstract base class with a set of methods for producing SVG code.
 
@@ -62,6 +112,14 @@ class SVGPresenter(cbg.misc.SearchableTree, svg.SVGElement):
     # Like size, a cursor is inherited by subordinate presenters, by default.
     cursor_class = None
 
+    # Card presenters are drawn once per card and copied into place for
+    # each copy of the card. Presenters whose drawing depends on where
+    # they are placed in an image should not be reusable.
+    reusable = True
+
+    # Wrapped lines of text, shared by all presenters.
+    wrap_cache = WrapCache()
+
     @classmethod
     def new(cls, field, parent=None, origin=None, size=None, cursor=None,
             **kwargs):
@@ -85,6 +143,7 @@ class SVGPresenter(cbg.misc.SearchableTree, svg.SVGElement):
         inst = super().new(**kwargs)
         inst.field = field
         inst.parent = parent
+        inst._capture_ancestors()
         inst.origin = inst._determine_origin(origin)
         inst.size = inst._determine_size(size)
         inst.cursor = inst._determine_cursor(cursor)
@@ -97,6 +156,31 @@ class SVGPresenter(cbg.misc.SearchableTree, svg.SVGElement):
 
         return inst
 
+    def _capture_ancestors(self):
+        '''Note the card presenter and image above self, where easily found.
+
+        Both are looked up repeatedly while drawing, so references are
+        kept for constant-time access. Where a parent is not a presenter,
+        the lookups fall back to searching the tree.
+
+        '''
+        parent = self.parent
+
+        if self.recursion_attribute_name:
+            self._card_presenter = self
+        else:
+            self._card_presenter = getattr(parent, '_card_presenter', None)
+
+        if isinstance(parent, SVGPresenter):
+            self._image = parent._image
+        elif getattr(parent, 'tag', None) == 'svg':
+            self._image = parent
+        else:
+            self._image = None
+
+        # Presenters found by _presenter_with(), by attribute name.
+        self._presenters_with = dict()
+
     def _determine_origin(self, origin):
         '''Return the absolute coordinates of the upper left corner of self.
 
@@ -173,7 +257,9 @@ class SVGPresenter(cbg.misc.SearchableTree, svg.SVGElement):
         means of controlling occlusion in the resulting image.
 
         '''
-        card = self._search_single(lambda p: p.recursion_attribute_name)
+        card = self._card_presenter
+        if card is None:
+            card = self._search_single(lambda p: p.recursion_attribute_name)
 
         if card is None:
             s = 'Unable to recursively present subordinate fields.'
@@ -193,35 +279,7 @@ class SVGPresenter(cbg.misc.SearchableTree, svg.SVGElement):
 
     def define(self, xml):
         '''Take an etree oject. Add as a definition if new, else ignore.'''
-
-        id_ = xml.get('id')
-
-        if id_ is None:
-            s = 'Definitions must have an "id" attribute set. "{}" does not.'
-            raise ValueError(s.format(lxml.etree.tostring(xml)))
-
-        # Avoid duplicates by ID, to keep the SVG clean.
-        for element in self.defs.iter():
-            if element.get('id') == id_:
-                # Compare elements.
-                # A previous version of this comparison used etree.tostring
-                # for depth. That was busted by apparent inheritance of the
-                # effective namespace map on lxml's iter().
-
-                if (element.tag == xml.tag and
-                        element.attrib == xml.attrib and
-                        element[:] == xml[:]):
-                    logging.debug('Excluding duplicate definition.')
-                    return
-                else:
-                    s = 'Existing: {}'.format(lxml.etree.tostring(element))
-                    logging.error(s)
-                    s = 'Proposed: {}'.format(lxml.etree.tostring(xml))
-                    logging.error(s)
-                    s = 'Dissimilar definitions with shared ID ({}).'
-                    raise ValueError(s.format(id_))
-
-        self.defs.append(xml)
+        self.image.define(xml)
 
     @property
     def defs(self):
@@ -236,6 +294,9 @@ class SVGPresenter(cbg.misc.SearchableTree, svg.SVGElement):
     @property
     def image(self):
         '''Access the top-level SVG element: the image.'''
+        if self._image is not None:
+            return self._image
+
         image = self._search_single(lambda p: p.tag == 'svg')
 
         if image is None:
@@ -245,25 +306,35 @@ class SVGPresenter(cbg.misc.SearchableTree, svg.SVGElement):
             s = 'Failed to identify parent image: Candidate has a parent.'
             raise Exception(s)
 
+        self._image = image
         return image
 
     def _presenter_with(self, attribute_name, select_value):
-        '''A method used to make methods for upward presenter tree search.'''
+        '''A method used to make methods for upward presenter tree search.
 
-        value = getattr(self, attribute_name)
-        if value is None:
-            if self.parent is None:
+        The attribute is always looked up on self first. An ancestor found
+        to have it is remembered, making repeated searches cheap, so the
+        attributes searched for must not be set on ancestors after the
+        first search from below. Setting them on self takes effect.
+
+        '''
+        if getattr(self, attribute_name) is not None:
+            presenter = self
+        else:
+            try:
+                presenter = self._presenters_with[attribute_name]
+            except KeyError:
+                if self.parent is None:
+                    s = 'No presenter with attribute "{}".'
+                    raise AttributeError(s.format(attribute_name))
                 # Recurse upwards.
-                s = 'No presenter with attribute "{}".'
-                raise AttributeError(s.format(attribute_name))
-            else:
-                return self.parent._presenter_with(attribute_name,
-                                                   select_value)
-        elif select_value:
-            return value
+                presenter = self.parent._presenter_with(attribute_name, False)
+                self._presenters_with[attribute_name] = presenter
 
+        if select_value:
+            return getattr(presenter, attribute_name)
         else:
-            return self
+            return presenter
 
     def line_feed(self, n_lines=1):
         '''Advance the cursor by the height of a line of text.'''
@@ -324,9 +395,29 @@ class SVGPresenter(cbg.misc.SearchableTree, svg.SVGElement):
                 element.text = line
 
     def _wrap(self, content, initial, subsequent):
-        return textwrap.wrap(content, width=self._characters_per_line,
-                             initial_indent=initial,
-                             subsequent_indent=subsequent)
+        '''Break content into lines, measured by font metrics if known.
+
+        The same text is commonly wrapped many times over, on each copy of
+        a card and on different cards, so results are cached.
+
+        '''
+        metrics = self.wardrobe.metrics
+        if metrics is None:
+            width = self._characters_per_line
+
+            def wrap():
+                return textwrap.wrap(content, width=width,
+                                     initial_indent=initial,
+                                     subsequent_indent=subsequent)
+        else:
+            width = self.size[0] / self.wardrobe.font_size
+
+            def wrap():
+                return metrics.wrap(content, width, initial_indent=initial,
+                                    subsequent_indent=subsequent)
+
+        key = (content, width, initial, subsequent, metrics)
+        return self.wrap_cache.lookup(key, wrap)
 
     @property
     def _characters_per_line(self):
@@ -19,9 +19,11 @@
 # Copyright 2014-2016 Viktor Eikman
 
 
+import hashlib
 import itertools
 import logging
 import collections
+import re
 
 import lxml.etree
 
@@ -68,6 +70,17 @@ class SVGElement(lxml.etree.ElementBase):
     # Each inheritor of this generator is uniquely ID'd, if ID'd.
     _id_iterator = itertools.count()
 
+    # If true, IDs are instead derived from a digest of the contents of
+    # each element, so that identical definitions share an ID and output
+    # is the same from run to run and across processes.
+    content_addressed_ids = False
+
+    # Attributes to disregard when deriving an ID from contents.
+    _id_attribute_blacklist = frozenset()
+
+    # The number of hexadecimal digits of a digest to use in an ID.
+    _id_digest_length = 12
+
     # Certain keyword arguments will automatically be intercepted
     # for inclusion in the "style" SVG attribute, instead of being
     # used as attributes on their own.
@@ -160,8 +173,15 @@ class SVGElement(lxml.etree.ElementBase):
             s = 'SVG element class {} has no tag name.'
             raise NotImplementedError(s.format(cls.__name__))
 
-        # lxml can only handle bytes and unicode.
-        attributes = {str(k): str(v) for k, v in attributes.items()}
+        # lxml can only handle bytes and unicode. A style may also be given
+        # as a mapping, which is merged without parsing.
+        style = attributes.pop('style', None)
+        attributes = {k: v if type(v) is str else str(v)
+                      for k, v in attributes.items()}
+        if style is not None:
+            if not isinstance(style, (str, collections.abc.Mapping)):
+                style = str(style)
+            attributes['style'] = style
         # Note that the nsmap argument (lxml's namespace map convenience)
         # exists here because it must be None or a dict, not a string.
 
@@ -199,36 +219,47 @@ class SVGElement(lxml.etree.ElementBase):
         '''
 
         # Fetch the unfiltered, explicit content of the attribute:
-        caught = subject.pop(attribute_name, {})
+        caught = subject.pop(attribute_name, None)
+
+        # Find new properties in the subject dictionary. Which they are
+        # depends only on the roster and the set of keys, which is usually
+        # the same from one call to the next from the same place.
+        cache = _roster_cache(roster)
+        keys = tuple(subject)
+        try:
+            selection = cache[keys]
+        except KeyError:
+            selection = tuple((k, python_to_svg_key(k)) for k in keys
+                              if python_to_svg_key(k) in roster)
+            cache[keys] = selection
+
+        if caught is None and not selection:
+            return
 
         # Transform, temporarily, into a dictionary with SVG keys intact:
-        if caught:
+        if isinstance(caught, collections.abc.Mapping):
+            # Prebuilt, as by a wardrobe. Copied, to leave the original.
+            caught = {python_to_svg_key(k): v for k, v in caught.items()}
+        elif caught and isinstance(caught, str):
             caught = (p.split(':') for p in caught.split(';') if p)
             caught = {k: v for k, v in caught}
-        elif caught == '':
+        elif caught == '' or caught is None:
             caught = {}
-        elif not isinstance(caught, collections.abc.Mapping):
+        else:
             s = 'Discarding unexpected value for {}: {}'
             logging.warning(s.format(attribute_name, repr(caught)))
             caught = {}
 
-        # Add new properties from subject dictionary:
-        for python_key in tuple(subject):
-            svg_key = python_to_svg_key(python_key)
-            if svg_key in roster:
-                value = subject.pop(python_key)
-                caught[svg_key] = value  # On collision, override caught.
-
-        # Destroy dummy values using a copy as a stable index:
-        for svg_key, value in tuple(caught.items()):
-            if value == '':
-                # A dummy inserted to pre-empt filtering by this method.
-                caught.pop(svg_key)
+        # Add the new properties:
+        for python_key, svg_key in selection:
+            # On collision, override caught.
+            caught[svg_key] = subject.pop(python_key)
 
+        # Destroy dummy values, inserted to pre-empt filtering by this method.
         # Reinsert the attribute, as a string, into the subject dictionary:
-        if caught:
-            s = ';'.join(':'.join(map(str, p)) for p in sorted(caught.items()))
-            subject[attribute_name] = s
+        pairs = sorted((k, str(v)) for k, v in caught.items() if v != '')
+        if pairs:
+            subject[attribute_name] = ';'.join(':'.join(p) for p in pairs)
 
     def set_id(self):
         '''Generate and set a representative SVG "id" attribute.
@@ -248,7 +279,32 @@ class SVGElement(lxml.etree.ElementBase):
 
     def make_id(self):
         '''Generate a string for use as an "id" attribute.'''
-        return ''.join((self._id_prefix, str(next(self._id_iterator))))
+        if self.content_addressed_ids:
+            ignored = self._id_attribute_blacklist | {'id'}
+            form = repr(canonical_form(self, ignore=ignored)).encode()
+            suffix = hashlib.sha256(form).hexdigest()[:self._id_digest_length]
+        else:
+            suffix = str(next(self._id_iterator))
+        return ''.join((self._id_prefix, suffix))
+
+    def refresh_id(self):
+        '''Derive a content-addressed ID again, to reflect current contents.
+
+        Children appended after new() are not covered by an ID derived
+        there. IDs that are not content-addressed, including counted and
+        explicit ones, are left alone.
+
+        '''
+        id_ = self.get('id')
+        if not self.content_addressed_ids or id_ is None:
+            return id_
+
+        suffix = id_[len(self._id_prefix):]
+        if (id_.startswith(self._id_prefix) and
+                len(suffix) == self._id_digest_length and
+                re.fullmatch('[0-9a-f]+', suffix)):
+            return self.set_id()
+        return id_
 
     def append(self, element):
         '''An override.
@@ -273,6 +329,50 @@ class IDElement(SVGElement):
         return super().new(set_id=set_id, **attributes)
 
 
+def canonical_form(element, ignore=()):
+    '''Return a hashable representation of the structure of an element.
+
+    The form covers the tag, attributes and text of the element and its
+    descendants, but not its own tail, nor any namespace map inherited
+    from a tree the element is in. Attributes of the element itself that
+    are named in "ignore" are left out.
+
+    '''
+    tag = element.tag
+    if not isinstance(tag, str):
+        # A comment or processing instruction, tagged with a factory.
+        tag = tag.__name__
+    attrib = tuple(sorted((k, v) for k, v in element.attrib.items()
+                          if k not in ignore))
+    return (tag, attrib, element.text,
+            tuple(canonical_form(child) + (child.tail,) for child in element))
+
+
+# Caches of roster lookups by roster identity. See _roster_cache().
+_roster_caches = dict()
+
+
+def _roster_cache(roster):
+    '''Return a cache of keyword argument names selected by a roster.
+
+    The cache maps tuples of Python-style keys to tuples of those keys
+    in the roster, each paired with its SVG-style equivalent. There is
+    one cache for each roster, which is assumed not to change.
+
+    '''
+    try:
+        kept, cache = _roster_caches[id(roster)]
+        if kept is roster:
+            return cache
+    except KeyError:
+        pass
+
+    # The roster is kept, so that its ID cannot be reused.
+    cache = dict()
+    _roster_caches[id(roster)] = (roster, cache)
+    return cache
+
+
 def python_to_svg_key(string_key):
     '''SVG uses dashes as word separators in its attribute data.'''
     return string_key.replace('_', '-')
@@ -19,6 +19,9 @@
 # Copyright 2014-2016 Viktor Eikman
 
 
+import bisect
+import itertools
+
 import numpy
 
 from cbg.svg import presenter
@@ -33,19 +36,22 @@ class TablePresenter(presenter.IndentedPresenter):
     '''
 
     @classmethod
-    def requirements_by_column(cls, array):
-        '''A generator of character lengths by column of passed array.
+    def requirements_by_column(cls, array, measure=len):
+        '''A generator of text widths by column of passed array.
 
-        Generate one 2-tuple of integers per column of the array (table).
-        The first integer measures the longest word in any row of the column.
+        Generate one 2-tuple of numbers per column of the array (table).
+        The first number measures the longest word in any row of the column.
         The second measures the longest complete line.
 
+        Widths are measured with the passed function, by default in
+        characters.
+
         '''
         def longest_word(cell):
-            return max(map(lambda w: len(w), str(cell).split()))
+            return max(map(measure, str(cell).split()))
 
         def longest_line(cell):
-            return max(map(lambda l: len(l), str(cell).splitlines()))
+            return max(map(measure, str(cell).splitlines()))
 
         # Iterate over each column.
         for col_i in range(array.shape[-1]):
@@ -54,20 +60,9 @@ class TablePresenter(presenter.IndentedPresenter):
                    max(map(longest_line, cells)))
 
     @classmethod
-    def line_break(cls, string, target_width):
+    def line_break(cls, string, target_width, measure=len):
         '''Insert line breaks into a string. Each line fits passed width.'''
-        split = string.split()
-        lines = []
-        while split:
-            line = []
-            while split:
-                width_with_word = len(' '.join(line + [split[0]]))
-                if width_with_word <= target_width:
-                    line.append(split.pop(0))
-                else:
-                    break
-            lines.append(' '.join(line))
-        return '\n'.join(lines)
+        return _Cell(string, measure).rebroken(target_width)
 
     def present(self):
         array, width_requirements = self._adapt_to_space()
@@ -81,8 +76,25 @@ class TablePresenter(presenter.IndentedPresenter):
 
         self.cursor.slide(self.wardrobe.after_paragraph)
 
+    @property
+    def _measurement(self):
+        '''A function measuring text, the space available and its unit.
+
+        Text is measured in characters, unless the wardrobe has font
+        metrics, in which case it is measured in ems. The unit is the
+        size of one such measure in user units.
+
+        '''
+        metrics = self.wardrobe.metrics
+        if metrics is None:
+            return (len, self._characters_per_line,
+                    self.wardrobe.character_width)
+
+        unit = self.wardrobe.font_size
+        return metrics.width, self.size[0] / unit, unit
+
     def _insert_row(self, row, width_requirements):
-        cwidth = self.wardrobe.character_width
+        cwidth = self._measurement[2]
         max_lines = max(map(lambda c: len(c.splitlines()), row))
         y_init = self.line_feed(n_lines=max_lines)
 
@@ -113,39 +125,110 @@ class TablePresenter(presenter.IndentedPresenter):
                                     column=col_i)
 
     def _adapt_to_space(self):
-        '''Make columns of text in a copy of self.field's contents.'''
-        array = self.field.copy()
-        requirements = tuple(self.requirements_by_column(array))
+        '''Make columns of text in a copy of self.field's contents.
 
-        minima = sum(r[0] for r in requirements)
-        if minima > self._characters_per_line:
+        While the table is too wide, the column with the most room for
+        narrowing (the leftmost, in a tie) sets a target about one
+        character narrower than its widest line. Every cell in the table
+        that is longer than that column's widest word is then rebroken to
+        the target, and all columns are measured again.
+
+        Each cell is measured only once. Each rebreak is then a binary
+        search per line over the cell's cumulative word widths, and text
+        is only assembled for the final breaks.
+
+        '''
+        array = self.field.copy()
+        measure, capacity, _ = self._measurement
+        cells = {i: _Cell(str(self.field[i[0]][i[1]]), measure)
+                 for i in numpy.ndindex(array.shape)}
+        n_cols = array.shape[-1]
+
+        minima = [max(cells[i].longest_word for i in cells if i[1] == col_i)
+                  for col_i in range(n_cols)]
+        if sum(minima) > capacity:
             s = 'Minimal column widths {} too large for available space {}.'
-            raise ValueError(s.format(minima, self._characters_per_line))
+            raise ValueError(s.format(sum(minima), capacity))
+
+        # The target width each cell was last rebroken to, if any.
+        targets = dict.fromkeys(cells)
+
+        def widths():
+            ret = [0] * n_cols
+            for i, cell in cells.items():
+                ret[i[1]] = max(ret[i[1]], cell.width(targets[i]))
+            return ret
+
+        # Narrow by about one character: exactly one, measured by len().
+        step = measure('n')
 
-        while sum(r[1] for r in requirements) > self._characters_per_line:
-            deltas = tuple(r[1] - r[0] for r in requirements)
+        requirements = widths()
+        while sum(requirements) > capacity:
+            deltas = tuple(w - m for w, m in zip(requirements, minima))
             max_delta = max(deltas)
             assert max_delta > 0
-            target_col_i = deltas.index(max_delta)
-            self._rebreak_column(array, target_col_i,
-                                 requirements[target_col_i])
-
-            # Check requirements again after having adjusted one column.
-            requirements = tuple(self.requirements_by_column(array))
-
-        return array, requirements
-
-    def _rebreak_column(self, array, col_i, prior_requirements):
-        min_width, max_width = prior_requirements
-        for i in numpy.ndindex(array.shape):
-            self._rebreak_cell(array, i, min_width, max_width - 1)
-
-    def _rebreak_cell(self, array, i, min_width, target_width):
-        row_i, col_i = i
-        assert target_width >= min_width
-        original = self.field[row_i][col_i]
-        if len(original) <= min_width:
-            # Not possible or no point to breaking further.
-            return
-        array[row_i][col_i] = self.line_break(array[row_i][col_i],
-                                              target_width)
+            col_i = deltas.index(max_delta)
+            target = max(minima[col_i], requirements[col_i] - step)
+            for i, cell in cells.items():
+                if cell.length > minima[col_i]:
+                    targets[i] = target
+
+            # Check requirements again after having adjusted the table.
+            requirements = widths()
+
+        for i, target in targets.items():
+            if target is not None:
+                array[i[0]][i[1]] = cells[i].rebroken(target)
+
+        return array, tuple(zip(minima, requirements))
+
+
+class _Cell():
+    '''The text of one table cell, with each of its words measured once.'''
+
+    def __init__(self, text, measure):
+        self.text = text
+        self.words = text.split()
+        self.longest_word = max(map(measure, self.words), default=0)
+        self.longest_line = max(map(measure, text.splitlines()), default=0)
+        self.length = measure(text)
+
+        # The width of words i to j (exclusive) on one line is
+        # ends[j] - ends[i] - space.
+        self._space = measure(' ')
+        self._ends = [0] + list(itertools.accumulate(
+            measure(w) + self._space for w in self.words))
+
+        # Widths after rebreaking, by target width.
+        self._widths = dict()
+
+    def width(self, target_width=None):
+        '''The width of the widest line, after rebreaking if targeted.'''
+        if target_width is None:
+            return self.longest_line
+        try:
+            return self._widths[target_width]
+        except KeyError:
+            ends = self._ends
+            width = max((ends[j] - ends[i] for i, j in
+                         self._breaks(target_width)),
+                        default=self._space) - self._space
+            self._widths[target_width] = width
+            return width
+
+    def rebroken(self, target_width):
+        '''Return the text with line breaks fitting the target width.'''
+        return '\n'.join(' '.join(self.words[i:j])
+                         for i, j in self._breaks(target_width))
+
+    def _breaks(self, target_width):
+        '''Generate the word index spans of greedily filled lines.'''
+        ends = self._ends
+        limit = target_width + self._space
+        start = 0
+        while start < len(self.words):
+            # At least one word goes on each line, even if it is too wide.
+            end = max(start + 1, bisect.bisect_right(ends, ends[start] + limit,
+                                                     lo=start + 1) - 1)
+            yield start, end
+            start = end
@@ -15,3 +15,24 @@ class Basics(unittest.TestCase):
         self.assertEqual(ret[0].tag, 'feGaussianBlur')
         self.assertEqual(ret[0].attrib, {'result': 'blur',
                                          'stdDeviation': '2'})
+
+
+class ContentAddressedIDs(unittest.TestCase):
+    def setUp(self):
+        filter_.svg.SVGElement.content_addressed_ids = True
+
+    def tearDown(self):
+        filter_.svg.SVGElement.content_addressed_ids = False
+
+    def test_identical_share_id(self):
+        a, b = filter_.Feather.new(), filter_.Feather.new()
+        self.assertEqual(a.get('id'), b.get('id'))
+        self.assertTrue(a.get('id').startswith('f'))
+
+    def test_different_contents(self):
+        a, b = filter_.GaussianBlur.new(1), filter_.GaussianBlur.new(2)
+        self.assertNotEqual(a.get('id'), b.get('id'))
+
+    def test_stable(self):
+        self.assertEqual(filter_.GaussianBlur.new(2).get('id'),
+                         'fbcf5ba56f68c')
@@ -3,12 +3,16 @@
 
 import unittest
 import logging
+import os
+import tempfile
 
 import lxml.etree
 
 import cbg.test_misc
 import cbg.svg.card as card
 import cbg.svg.image as image
+import cbg.svg.misc as misc
+import cbg.svg.shapes as shapes
 import cbg.sample.wardrobe
 
 
@@ -50,9 +54,139 @@ class DefsElement(unittest.TestCase):
         self.presenter.define(lxml.etree.Element('e', id='7'))
         self.assertEqual(len(self.image.defs), 1)
 
+    def test_no_addition_recreated_with_children(self):
+        for _ in range(2):
+            e = lxml.etree.Element('e', id='9')
+            lxml.etree.SubElement(e, 'f', a='1')
+            self.presenter.define(e)
+        self.assertEqual(len(self.image.defs), 1)
+
+    def test_no_addition_preexisting(self):
+        self.image.defs.append(lxml.etree.Element('e', id='2'))
+        self.presenter.define(lxml.etree.Element('e', id='2'))
+        self.assertEqual(len(self.image.defs), 1)
+
+    @cbg.test_misc.suppress(logging.ERROR)
+    def test_conflict_in_children(self):
+        e = lxml.etree.Element('e', id='4')
+        lxml.etree.SubElement(e, 'f', a='1')
+        self.presenter.define(e)
+        e = lxml.etree.Element('e', id='4')
+        lxml.etree.SubElement(e, 'f', a='2')
+        with self.assertRaises(ValueError):
+            self.presenter.define(e)
+
     @cbg.test_misc.suppress(logging.ERROR)
     def test_conflict(self):
         self.presenter.define(lxml.etree.Element('e', id='5'))
         self.assertEqual(len(self.image.defs), 1)
         with self.assertRaises(ValueError):
             self.presenter.define(lxml.etree.Element('f', id='5'))
+
+
+class Symbols(unittest.TestCase):
+    def _group(self, text, transform):
+        group = lxml.etree.Element('g', transform=transform)
+        lxml.etree.SubElement(group, 'text').text = text
+        return group
+
+    def setUp(self):
+        self.image = image.SVG.new()
+        self.image.append(self._group('a', 'translate(0,0)'))
+        self.image.append(self._group('a', 'translate(1,0)'))
+        self.image.append(self._group('b', 'translate(2,0)'))
+        self.image.use_symbols()
+
+    def test_shared(self):
+        self.assertEqual(len(self.image.defs.findall('symbol')), 2)
+
+    def test_references(self):
+        href = '{{{}}}href'.format(image.svg.NAMESPACE_XLINK)
+        uses = self.image.findall('use')
+        self.assertEqual([u.get('transform') for u in uses],
+                         ['translate(0,0)', 'translate(1,0)',
+                          'translate(2,0)'])
+        self.assertEqual(uses[0].get(href), uses[1].get(href))
+        self.assertNotEqual(uses[0].get(href), uses[2].get(href))
+        self.assertIsNone(self.image.find('g'))
+
+
+class Save(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.filepath = os.path.join(self.folder.name, 'i.svg')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_digest_stable(self):
+        d0 = image.SVG.new().save(self.filepath)
+        d1 = image.SVG.new().save(self.filepath)
+        self.assertEqual(d0, d1)
+
+    def test_unchanged_not_rewritten(self):
+        digest = image.SVG.new().save(self.filepath)
+        with open(self.filepath, mode='w') as f:
+            f.write('sentinel')
+        image.SVG.new().save(self.filepath, previous_digest=digest)
+        with open(self.filepath) as f:
+            self.assertEqual(f.read(), 'sentinel')
+
+    def test_changed_rewritten(self):
+        image.SVG.new().save(self.filepath)
+        with open(self.filepath, mode='w') as f:
+            f.write('sentinel')
+        image.SVG.new().save(self.filepath, previous_digest='0')
+        with open(self.filepath) as f:
+            self.assertNotEqual(f.read(), 'sentinel')
+
+
+class ContentAddressedDefinitions(unittest.TestCase):
+    def setUp(self):
+        image.svg.SVGElement.content_addressed_ids = True
+        self.image = image.SVG.new()
+
+    def tearDown(self):
+        image.svg.SVGElement.content_addressed_ids = False
+
+    def _clip_path(self, width):
+        clip_path = misc.ClipPath.new()
+        clip_path.append(shapes.Rect.new((0, 0), (width, 1)))
+        return clip_path
+
+    def test_filled_after_creation(self):
+        a, b = self._clip_path(1), self._clip_path(2)
+        self.image.define(a)
+        self.image.define(b)
+        self.assertEqual(len(self.image.defs), 2)
+        self.assertNotEqual(a.get('id'), b.get('id'))
+
+    def test_filled_alike(self):
+        self.image.define(self._clip_path(1))
+        self.image.define(self._clip_path(1))
+        self.assertEqual(len(self.image.defs), 1)
+
+    def test_explicit_id_kept(self):
+        e = misc.Symbol.new(id='explicit')
+        e.append(shapes.Rect.new((0, 0), (1, 1)))
+        self.image.define(e)
+        self.assertIsNotNone(self.image.defs.find("*[@id='explicit']"))
+
+
+class DefinitionIndex(unittest.TestCase):
+    def setUp(self):
+        self.image = image.SVG.new()
+        self.image.define(lxml.etree.Element('e', id='X'))
+
+    @cbg.test_misc.suppress(logging.ERROR)
+    def test_appended_directly(self):
+        self.image.defs.append(lxml.etree.Element('e', id='Y'))
+        with self.assertRaises(ValueError):
+            self.image.define(lxml.etree.Element('f', id='Y'))
+        self.image.define(lxml.etree.Element('e', id='Y'))
+        self.assertEqual(len(self.image.defs), 2)
+
+    def test_removed(self):
+        self.image.defs.remove(self.image.defs[0])
+        self.image.define(lxml.etree.Element('f', id='X'))
+        self.assertEqual(len(self.image.defs), 1)
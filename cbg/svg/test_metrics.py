@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+'''Unit tests for CBG.'''
+
+import os
+import struct
+import tempfile
+import textwrap
+import unittest
+
+import cbg.content.field as field
+import cbg.svg.metrics as metrics
+import cbg.svg.table as table
+import cbg.svg.wardrobe as wardrobe
+
+
+AFM = '''StartFontMetrics 2.0
+FontName Test
+StartCharMetrics 4
+C 32 ; WX 250 ; N space ; B 0 0 0 0 ;
+C 105 ; WX 250 ; N i ; B 0 0 0 0 ;
+C 109 ; WX 750 ; N m ; B 0 0 0 0 ;
+C -1 ; WX 600 ; N uni00E9 ; B 0 0 0 0 ;
+EndCharMetrics
+EndFontMetrics
+'''
+
+
+def sfnt(advances, units_per_em=1000):
+    '''Build a minimal TrueType file mapping characters to widths.'''
+    characters = sorted(advances)
+    n_glyphs = len(characters) + 1  # Glyph 0 is .notdef.
+
+    head = bytearray(54)
+    struct.pack_into('>H', head, 18, units_per_em)
+    hhea = bytearray(36)
+    struct.pack_into('>H', hhea, 34, n_glyphs)
+    hmtx = struct.pack('>' + 'Hh' * n_glyphs,
+                       *sum(([w, 0] for w in [0] + [advances[c]
+                                                    for c in characters]),
+                            []))
+
+    # A cmap in format 4, one segment per character plus the terminator.
+    codes = [ord(c) for c in characters] + [0xFFFF]
+    n = len(codes)
+    deltas = [(i + 1 - code) % 65536 for i, code in enumerate(codes[:-1])]
+    subtable = struct.pack('>7H', 4, 16 + 8 * n, 0, 2 * n, 0, 0, 0)
+    subtable += struct.pack('>{}H'.format(n), *codes) + b'\0\0'
+    subtable += struct.pack('>{}H'.format(n), *codes)
+    subtable += struct.pack('>{}H'.format(n), *(deltas + [1]))
+    subtable += struct.pack('>{}H'.format(n), *([0] * n))
+    cmap = struct.pack('>HHHHI', 0, 1, 3, 1, 12) + subtable
+
+    tables = ((b'cmap', cmap), (b'head', bytes(head)),
+              (b'hhea', bytes(hhea)), (b'hmtx', hmtx))
+    offset = 12 + 16 * len(tables)
+    directory = struct.pack('>IHHHH', 0x00010000, len(tables), 0, 0, 0)
+    body = b''
+    for tag, data in tables:
+        directory += struct.pack('>4sIII', tag, 0, offset + len(body),
+                                 len(data))
+        body += data
+    return directory + body
+
+
+class Parsing(unittest.TestCase):
+    def test_afm(self):
+        m = metrics.Metrics.from_afm(AFM)
+        self.assertEqual(m.widths, {' ': 0.25, 'i': 0.25, 'm': 0.75,
+                                    'é': 0.6})
+
+    def test_afm_empty(self):
+        with self.assertRaises(metrics.Metrics.Unreadable):
+            metrics.Metrics.from_afm('StartFontMetrics 2.0\n')
+
+    def test_truetype(self):
+        data = sfnt({'a': 500, 'b': 1000, 'é': 250}, units_per_em=2000)
+        m = metrics.Metrics.from_sfnt(data)
+        self.assertEqual(m.widths, {'a': 0.25, 'b': 0.5, 'é': 0.125})
+
+    def test_truetype_damaged(self):
+        with self.assertRaises(metrics.Metrics.Unreadable):
+            metrics.Metrics.from_sfnt(sfnt({'a': 500})[:100])
+
+    def test_afm_malformed(self):
+        for line in ('C 32 ; WX 250 ; N space ; L', 'C x ; WX 250 ;',
+                     'C 32 ; WX wide ;'):
+            with self.subTest(line):
+                code = AFM.replace('C 32 ; WX 250 ; N space ; B 0 0 0 0 ;',
+                                   line)
+                with self.assertRaises(metrics.Metrics.Unreadable):
+                    metrics.Metrics.from_afm(code)
+
+    def test_truetype_without_metrics(self):
+        data = bytearray(sfnt({'a': 500}))
+        tables = metrics.Metrics._sfnt_tables(bytes(data))
+        struct.pack_into('>H', data, tables[b'hhea'] + 34, 0)
+        with self.assertRaises(metrics.Metrics.Unreadable):
+            metrics.Metrics.from_sfnt(bytes(data))
+
+    def test_file_by_suffix(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'test.afm')
+            with open(path, mode='w', encoding='latin-1') as f:
+                f.write(AFM)
+            self.assertEqual(metrics.Metrics.from_file(path).width('mi'), 1)
+
+
+class Measurement(unittest.TestCase):
+    def setUp(self):
+        self.metrics = metrics.Metrics({' ': 0.25, 'i': 0.25, 'm': 0.75},
+                                       default=0.5)
+
+    def test_width(self):
+        self.assertEqual(self.metrics.width('mi mx'), 2.5)
+
+    def test_prefix_sums(self):
+        self.assertEqual(self.metrics.prefix_sums('mix'), [0, 0.75, 1, 1.5])
+
+    def test_wrap_by_width(self):
+        # Narrow words share a line that a character count would break.
+        self.assertEqual(self.metrics.wrap('ii ii ii mm mm', 2),
+                         ['ii ii ii', 'mm', 'mm'])
+
+    def test_wrap_indents(self):
+        self.assertEqual(self.metrics.wrap('mm mm mm', 1.75, '', 'i'),
+                         ['mm', 'imm', 'imm'])
+
+    def test_wrap_long_word(self):
+        self.assertEqual(self.metrics.wrap('i mmmmm i', 2),
+                         ['i', 'mm', 'mm', 'm i'])
+
+    def test_wrap_like_textwrap_in_monospace(self):
+        mono = metrics.Metrics(dict(), default=0.5)
+        text = 'The quick brown fox jumps over the lazy dog ' * 3
+        for width in range(7, 30):
+            ref = textwrap.wrap(text, width=width, initial_indent='* ',
+                                subsequent_indent='  ')
+            self.assertEqual(mono.wrap(text, width / 2, initial_indent='* ',
+                                       subsequent_indent='  '), ref)
+
+
+class Fonts(unittest.TestCase):
+    def test_no_files(self):
+        self.assertIsNone(wardrobe.Font('F').metrics())
+
+    def test_unreadable_file(self):
+        font = wardrobe.Font('F', files={wardrobe.REGULAR: '/nonexistent'})
+        with self.assertLogs(level='WARNING'):
+            self.assertIsNone(font.metrics())
+
+    def test_malformed_file(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'malformed.afm')
+            with open(path, mode='w', encoding='latin-1') as f:
+                f.write(AFM.replace('N space ;', 'N space ; L ;'))
+            font = wardrobe.Font('F', files={wardrobe.REGULAR: path})
+            with self.assertLogs(level='WARNING'):
+                self.assertIsNone(font.metrics())
+
+    def test_bold_fallback(self):
+        font = wardrobe.Font('F', bold_to_roman=2)
+        font._metrics[wardrobe.REGULAR] = metrics.Metrics({'a': 0.5})
+        self.assertEqual(font.metrics(weight='bold').width('a'), 1)
+        self.assertEqual(font.metrics(weight='thinner').width('a'), 0.5)
+
+
+class Table(unittest.TestCase):
+    def test_measured_columns(self):
+        font = wardrobe.Font('F')
+        font._metrics[wardrobe.REGULAR] = metrics.Metrics({'i': 0.25,
+                                                           ' ': 0.25},
+                                                          default=1)
+        f = field.Table(specification=(('i', 'h'),
+                                       ('iiii iiii', 'c c c')))
+        result = list()
+
+        class Implementation(table.TablePresenter):
+            class Wardrobe(wardrobe.Wardrobe):
+                font_size = 1
+                modes = {wardrobe.MAIN: wardrobe.Mode(font=font)}
+
+            def present(inst):
+                result.extend(inst._adapt_to_space()[0].tolist())
+
+        # The narrow column is not broken, though it has more characters.
+        Implementation.new(f, size=(7, 2))
+        self.assertEqual(result, [['i', 'h'], ['iiii iiii', 'c c\nc']])
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+'''Unit tests for CBG.'''
+
+import unittest
+
+import cbg.svg.card as card
+import cbg.svg.image as image
+import cbg.svg.presenter as presenter
+import cbg.sample.wardrobe
+
+
+class Ancestors(unittest.TestCase):
+
+    class Card(card.CardPresenter):
+        Wardrobe = cbg.sample.wardrobe.MiniEuroMain
+        recursion_attribute_name = presenter.RECURSION_FRONT
+        size = (10, 10)
+        marker = 'card'
+        absent = None
+
+        def present(self):
+            pass
+
+    class Field(presenter.SVGPresenter):
+        Wardrobe = cbg.sample.wardrobe.MiniEuroMain
+        marker = None
+        absent = None
+
+        def present(self):
+            pass
+
+    def setUp(self):
+        self.image = image.SVG.new()
+        field = unittest.mock.MagicMock()
+        field.presenter_size_override = None
+        self.card = self.Card.new(field, parent=self.image)
+        self.outer = self.Field.new(field, parent=self.card)
+        self.inner = self.Field.new(field, parent=self.outer)
+
+    def test_image(self):
+        self.assertIs(self.inner.image, self.image)
+        self.assertIs(self.inner.defs, self.image.defs)
+
+    def test_card_presenter(self):
+        self.assertIs(self.card._card_presenter, self.card)
+        self.assertIs(self.inner._card_presenter, self.card)
+
+    def test_presenter_with(self):
+        self.assertIs(self.inner._presenter_with('marker', False), self.card)
+        self.assertEqual(self.inner._presenter_with('marker', True), 'card')
+        self.assertIs(self.outer._presenters_with['marker'], self.card)
+
+    def test_presenter_with_set_on_self(self):
+        self.inner._presenter_with('marker', False)
+        self.inner.marker = 'inner'
+        self.assertIs(self.inner._presenter_with('marker', False), self.inner)
+        self.assertEqual(self.inner._presenter_with('marker', True), 'inner')
+        self.assertNotIn('marker', self.card._presenters_with)
+
+    def test_presenter_with_fixed_on_ancestors(self):
+        # As documented, ancestors are searched only once.
+        self.inner._presenter_with('marker', False)
+        self.outer.marker = 'outer'
+        self.assertIs(self.outer._presenter_with('marker', False), self.outer)
+        self.assertIs(self.inner._presenter_with('marker', False), self.card)
+
+    def test_presenter_with_missing(self):
+        with self.assertRaises(AttributeError):
+            self.inner._presenter_with('absent', False)
+
+
+class WrapCache(unittest.TestCase):
+    def test_counters(self):
+        cache = presenter.WrapCache()
+        self.assertEqual(cache.lookup('a', lambda: ['x']), ['x'])
+        self.assertEqual(cache.lookup('a', lambda: ['y']), ['x'])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertEqual(cache.hit_rate, 0.5)
+
+    def test_least_recently_used_evicted(self):
+        cache = presenter.WrapCache(maxsize=2)
+        cache.lookup('a', list)
+        cache.lookup('b', list)
+        cache.lookup('a', list)
+        cache.lookup('c', list)
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.lookup('a', lambda: ['new']), [])
+        self.assertEqual(cache.lookup('b', lambda: ['new']), ['new'])
+
+    def test_shared_by_presenters(self):
+        class Field(Ancestors.Field):
+            wrap_cache = presenter.WrapCache()
+
+        field = unittest.mock.MagicMock()
+        field.presenter_size_override = None
+        text = 'The same text on two cards.'
+        wrapped = [Field.new(field, parent=Ancestors.Card.new(field),
+                             size=(20, 10))._wrap(text, '', '')
+                   for _ in range(2)]
+        self.assertEqual(wrapped[0], wrapped[1])
+        self.assertEqual((Field.wrap_cache.hits, Field.wrap_cache.misses),
+                         (1, 1))
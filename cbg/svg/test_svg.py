@@ -71,6 +71,19 @@ class ArgumentFilteringFixture(unittest.TestCase):
         svg.SVGElement._filter_arguments('c', self.roster, attr)
         self.assertEqual(attr, {'c': 'f-f:2'})
 
+    def test_filtering_mapping(self):
+        mapping = svg.KeyValuePairs({'e': 4, 'd_d': 3})
+        attr = {'a': 1, 'b': 2, 'c': mapping}
+        svg.SVGElement._filter_arguments('c', self.roster, attr)
+        self.assertEqual(attr, {'a': 1, 'c': 'b:2;d-d:3;e:4'})
+        self.assertEqual(mapping, {'e': 4, 'd_d': 3})
+
+    def test_filtering_repeated(self):
+        for _ in range(2):
+            attr = {'a': 1, 'b': 2}
+            svg.SVGElement._filter_arguments('c', self.roster, attr)
+            self.assertEqual(attr, {'a': 1, 'c': 'b:2'})
+
 
 class ArgumentFilteringSVG(unittest.TestCase):
 
@@ -84,3 +97,9 @@ class ArgumentFilteringSVG(unittest.TestCase):
     def test_filtering_override(self):
         xml = self.E.new(style='stroke-width:3', stroke_width=4)
         self.assertEqual(xml.attrib, {'style': 'stroke-width:4'})
+
+    def test_mapping_style(self):
+        style = svg.KeyValuePairs({'fill': '#ffffff', 'stroke_width': 0.5})
+        xml = self.E.new(style=style, x=1)
+        self.assertEqual(xml.attrib,
+                         {'x': '1', 'style': 'fill:#ffffff;stroke-width:0.5'})
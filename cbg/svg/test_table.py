@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 '''Unit tests for CBG.'''
 
+import random
 import unittest
 
 import cbg.content.field as field
@@ -10,21 +11,24 @@ import cbg.svg.wardrobe as wardrobe
 
 class ColumnWidthAutoAdjustment(unittest.TestCase):
 
-    def _adapt(self, specification, ref):
+    def _adapt(self, specification, ref, capacity=10):
         f = field.Table(specification=specification)
+        result = list()
 
         class Implementation(table.TablePresenter):
             class Wardrobe(wardrobe.Wardrobe):
                 font_size = 5
                 modes = {wardrobe.MAIN: wardrobe.Mode(font=wardrobe.Font('F'))}
 
-            _characters_per_line = 10
+            _characters_per_line = capacity
 
             def present(inst):
-                array, _ = inst._adapt_to_space()
+                array, requirements = inst._adapt_to_space()
                 self.assertEqual(array.tolist(), ref)
+                result.append(requirements)
 
         Implementation.new(f, size=(1, 2))
+        return result[0]
 
     def test_no_break(self):
         self._adapt((('h1', 'h2'),),
@@ -45,3 +49,90 @@ class ColumnWidthAutoAdjustment(unittest.TestCase):
                      ('c c c c c c', 'c', 'c c c'),),
                     [['h', 'h h\nh', 'h'],
                      ['c c\nc c\nc c', 'c', 'c c\nc']])
+
+    def test_empty_cell(self):
+        self._adapt((('h1', ''),
+                     ('c1a c1b c1c c1d', 'c2a')),
+                    [['h1', ''],
+                     ['c1a c1b\nc1c c1d', 'c2a']])
+
+    def test_multiple_columns_rebroken(self):
+        # Narrowing one column rebreaks long cells in other columns too.
+        requirements = self._adapt(
+            (('ccc dddd eeeee ccc', 'eeeee bb a bb ccc', 'eeeee bb'),
+             ('bb', 'ffffff eeeee a ggggggg', 'eeeee')),
+            [['ccc\ndddd\neeeee\nccc', 'eeeee\nbb a bb\nccc', 'eeeee\nbb'],
+             ['bb', 'ffffff\neeeee a\nggggggg', 'eeeee']],
+            capacity=20)
+        self.assertEqual(requirements, ((5, 5), (7, 7), (5, 5)))
+
+    def test_same_as_previous_solver(self):
+        class Hang(Exception):
+            pass
+
+        def line_break(string, target):
+            # As before, except that it would loop forever here.
+            split = string.split()
+            lines = []
+            while split:
+                line = []
+                while split and len(' '.join(line + [split[0]])) <= target:
+                    line.append(split.pop(0))
+                if not line:
+                    raise Hang
+                lines.append(' '.join(line))
+            return '\n'.join(lines)
+
+        def reference(rows, capacity):
+            # The previous solver, measuring every cell on every pass.
+            original = [list(r) for r in rows]
+            array = [list(r) for r in rows]
+            n_cols = len(rows[0])
+
+            def requirements():
+                return [(max(len(w) for r in array for w in r[c].split()),
+                         max(len(l) for r in array
+                             for l in r[c].splitlines()))
+                        for c in range(n_cols)]
+
+            reqs = requirements()
+            while sum(r[1] for r in reqs) > capacity:
+                deltas = [r[1] - r[0] for r in reqs]
+                min_width, max_width = reqs[deltas.index(max(deltas))]
+                for row_i, row in enumerate(array):
+                    for col_i, cell in enumerate(row):
+                        if len(original[row_i][col_i]) > min_width:
+                            row[col_i] = line_break(cell, max_width - 1)
+                reqs = requirements()
+            return array, tuple(map(tuple, reqs))
+
+        rng = random.Random(1)
+        n_compared = 0
+        while n_compared < 100:
+            n_cols = rng.randint(2, 3)
+            rows = tuple(tuple(' '.join(rng.choice('abcdefg') *
+                                        rng.randint(1, 7)
+                                        for _ in range(rng.randint(1, 5)))
+                               for _ in range(n_cols))
+                         for _ in range(rng.randint(1, 3)))
+            try:
+                array, requirements = reference(rows, 20)
+            except (Hang, ValueError):
+                continue
+            self.assertEqual(self._adapt(rows, array, capacity=20),
+                             requirements)
+            n_compared += 1
+
+
+class LineBreak(unittest.TestCase):
+    def test_greedy(self):
+        self.assertEqual(table.TablePresenter.line_break('a bb ccc d', 4),
+                         'a bb\nccc\nd')
+
+    def test_measure(self):
+        def measure(string):
+            return 2 * len(string)
+
+        self.assertEqual(table.TablePresenter.line_break('a bb ccc d', 8,
+                                                         measure=measure),
+                         'a bb\nccc\nd')
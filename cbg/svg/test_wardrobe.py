@@ -174,3 +174,27 @@ class Duplication(unittest.TestCase):
         ref = {keys.STYLE:
                'font-family:Geb;font-size:9.0px;font-weight:lighter'}
         self.assertEqual(w.to_svg_attributes(), ref)
+
+
+class Immutability(unittest.TestCase):
+    def test_immutable(self):
+        m = wr.Mode(bold=True)
+        with self.assertRaises(wr.Mode.Immutable):
+            m.weight = 'lighter'
+
+    def test_equal_by_value(self):
+        font = wr.Font('Wax')
+        m0 = wr.Mode(font=font, fill_colors=['#ffffff'])
+        m1 = wr.Mode(font=font, fill_colors=['#ffffff'])
+        self.assertEqual(m0, m1)
+        self.assertEqual(hash(m0), hash(m1))
+        self.assertNotEqual(m0, m0.copy(bold=True))
+
+    def test_cached_attributes_not_shared(self):
+        class Wardrobe(wr.Wardrobe):
+            modes = {wr.MAIN: wr.Mode(fill_colors=('#ba11ad',))}
+
+        a = Wardrobe().to_svg_attributes()
+        a['x'] = 1
+        self.assertEqual(Wardrobe().to_svg_attributes(),
+                         {keys.STYLE: 'fill:#ba11ad'})
@@ -30,6 +30,7 @@ import logging
 
 import cbg.misc as misc
 import cbg.keys as keys
+from cbg.svg import metrics
 from cbg.svg import svg
 
 
@@ -42,6 +43,16 @@ CONTRAST = 'contrast'
 ACCENT = 'accent'
 EMPHASIS = 'emphasis'
 
+# The face of a font used where a mode has neither weight nor style.
+REGULAR = 'regular'
+
+
+def _hashable(value):
+    '''Return value, or a tuple in place of a list, recursively.'''
+    if isinstance(value, list):
+        return tuple(map(_hashable, value))
+    return value
+
 
 class Font():
     '''A font, actually a font family, as handled by a wardrobe.
@@ -56,15 +67,52 @@ class Font():
     than-average letters, to cover most cases. Lines of unusually slim
     or broad characters are going to look bad.
 
+    For accurate measurements, pass a dictionary of local font files
+    (AFM, TrueType or OpenType), keyed by face: "regular", "bold",
+    "italic" or "bold italic". Where a file is missing for a face, the
+    regular face is scaled by bold-to-roman. Where there are no files,
+    or they cannot be read, the estimates are used as before.
+
     '''
-    def __init__(self, name, width_to_height=0.6, bold_to_roman=1.1):
+    def __init__(self, name, width_to_height=0.6, bold_to_roman=1.1,
+                 files=None):
         self.name = name
         self.width_to_height = width_to_height
         self.bold_to_roman = bold_to_roman
+        self.files = files or dict()
+        self._metrics = dict()
 
     def __str__(self):
         return self.name
 
+    def metrics(self, weight=None, style=None):
+        '''Return font metrics for a face, or None. Cached by face.'''
+        face = ' '.join(filter(None, (weight, style))) or REGULAR
+        try:
+            return self._metrics[face]
+        except KeyError:
+            pass
+
+        ret = self._load(face)
+        if ret is None and face != REGULAR:
+            ret = self.metrics()
+            if ret is not None and weight != 'thinner':
+                ret = ret.scaled(self.bold_to_roman)
+        self._metrics[face] = ret
+        return ret
+
+    def _load(self, face):
+        try:
+            filepath = self.files[face]
+        except KeyError:
+            return
+
+        try:
+            return metrics.Metrics.from_file(filepath)
+        except (OSError, metrics.Metrics.Unreadable) as e:
+            s = 'Falling back to estimated widths for {} {}: {}'
+            logging.warning(s.format(self.name, face, e))
+
 
 class Mode():
     '''An operating mode for a wardrobe.
@@ -72,8 +120,15 @@ class Mode():
     A simple wardrobe has just one mode. Commonly, a wardrobe has two:
     A primary mode and a second one for emphasis.
 
+    Modes are immutable once created, and compare equal by value, so that
+    they can serve as keys to cached output. Use copy() for variations.
+
     '''
 
+    class Immutable(AttributeError):
+        '''Raised on an attempt to alter an existing mode.'''
+        pass
+
     def __init__(self, font=None,
                  fill_colors=(), stroke_colors=(),
                  dasharray=None, thickness=None,
@@ -92,11 +147,11 @@ class Mode():
         # on a column basis for use in tables. Most wardrobes only have one
         # anchor. The last anchor is treated as the main one.
         if anchors:
-            self.anchors = anchors
+            self.anchors = tuple(anchors)
         else:
-            self.anchors = [self._filter(start=start, middle=middle, end=end,
+            self.anchors = (self._filter(start=start, middle=middle, end=end,
                                          direct=anchor,
-                                         default=keys.ALIGN_START)]
+                                         default=keys.ALIGN_START),)
 
         # If provided, "font" should be an instance of the Font class below.
         self.font = font
@@ -117,6 +172,24 @@ class Mode():
         # Miscellaneous.
         self.dasharray = dasharray  # Affects stroke.
 
+        # Freeze.
+        self._key = tuple((k, _hashable(v)) for k, v
+                          in sorted(self.__dict__.items()))
+
+    def __setattr__(self, name, value):
+        if '_key' in self.__dict__:
+            s = 'Cannot set "{}" on an existing mode. Use copy().'
+            raise self.Immutable(s.format(name))
+        super().__setattr__(name, value)
+
+    def __eq__(self, other):
+        if type(self) is not type(other):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
     def _filter(self, direct=None, default=None, **kwargs):
         '''Select one of the possible arguments for a single attribute.'''
         if direct:
@@ -160,7 +233,8 @@ class Mode():
 
     def copy(self, **kwargs):
         '''Make a copy, treating kwargs like overriding arguments to init.'''
-        attrib = self.__dict__.copy()
+        attrib = {k: v for k, v in self.__dict__.items()
+                  if not k.startswith('_')}
         attrib.update(kwargs)
         return self.__class__(**attrib)
 
@@ -179,6 +253,13 @@ class Mode():
             factor *= self.font.bold_to_roman
         return factor
 
+    @property
+    def metrics(self):
+        '''Font metrics for the mode's face, or None if unavailable.'''
+        if not self.font:
+            return
+        return self.font.metrics(weight=self.weight, style=self.style)
+
 
 class Wardrobe():
     '''A set of fonts, colors and other presentation-layer assets.
@@ -204,7 +285,18 @@ class Wardrobe():
     line_height_factor = 1.17
     paragraph_break_factor = 0.3
 
+    # SVG attributes by wardrobe class, mode, font size and column.
+    # Shared by all wardrobes, which are assumed not to change except by
+    # switching modes. See to_svg_attributes().
+    _attribute_cache = dict()
+
     def __init__(self):
+        '''Set up for the main mode.
+
+        A wardrobe instance holds little more than its current mode, so
+        that each presenter can have its own at little cost.
+
+        '''
         self.line_height = None
         self.after_paragraph = None
         if self.font_size:
@@ -244,6 +336,17 @@ class Wardrobe():
 
         return self.font_size * self.mode.character_width_to_height
 
+    @property
+    def metrics(self):
+        '''Font metrics for the current mode, or None if unavailable.
+
+        Widths from the metrics are in ems, i.e. multiples of font size.
+
+        '''
+        if not self.literate:
+            return
+        return self.mode.metrics
+
     def to_svg_attributes(self, column=0, transform_ext=None):
         '''Produce a simple dictionary for use with SVGElement.
 
@@ -251,8 +354,23 @@ class Wardrobe():
         transformation, and even then, only if it's configured for
         this usage.
 
+        The dictionary is computed once for each combination of wardrobe
+        class, mode, font size and column, and copied thereafter. Where
+        the wardrobe has transformations, it is computed every time.
+
         '''
+        if self.transformations:
+            return self._make_svg_attributes(column, transform_ext)
+
+        key = (type(self), self.mode, self.font_size, column)
+        try:
+            attrib = self._attribute_cache[key]
+        except KeyError:
+            attrib = self._make_svg_attributes(column, None)
+            self._attribute_cache[key] = attrib
+        return dict(attrib)
 
+    def _make_svg_attributes(self, column, transform_ext):
         attrib = dict()
         style = svg.KeyValuePairs()
 
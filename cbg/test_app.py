@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+'''Unit tests for CBG.'''
+
+import json
+import os
+import stat
+import tempfile
+import threading
+import unittest
+import unittest.mock
+
+import cbg.app as app
+import cbg.content.image
+import cbg.layout
+import cbg.test_layout as test_layout
+
+
+def application(folder, *args):
+    '''Make an application reading specifications from a folder.'''
+    with unittest.mock.patch('sys.argv', ['test', '-q'] + list(args)):
+        return app.Application('Test', {'d': test_layout.Card},
+                               folder_specs=folder)
+
+
+def write_spec(folder, titles):
+    with open(os.path.join(folder, 'd.json'), mode='w') as f:
+        json.dump({t: {} for t in titles}, f)
+
+
+class Arguments(unittest.TestCase):
+    def test_incremental_content_ids(self):
+        self.assertFalse(application('specs').args.content_ids)
+        self.assertTrue(application('specs', '-i').args.content_ids)
+        self.assertTrue(application('specs', '--watch').args.content_ids)
+
+
+class Watch(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = self._tmp.name
+        self.addCleanup(self._tmp.cleanup)
+        write_spec(self.folder, ('alpha', 'beta'))
+        self.app = application(self.folder, '--watch', 'singles')
+        self.app.folder_svg = os.path.join(self.folder, 'svg')
+
+    def _rebuild(self, known):
+        self.app._refresh_decks(known)
+        decks = [deck for _, deck in known.values()]
+        realize = cbg.content.image.Placement.realize
+        with unittest.mock.patch.object(cbg.content.image.Placement,
+                                        'realize', autospec=True,
+                                        side_effect=realize) as mock:
+            with self.assertLogs(level='INFO'):
+                self.app._rebuild(decks)
+        return mock.call_count
+
+    def _svg_files(self):
+        folder = self.app.folder_svg
+        return sorted(os.path.join(folder, f) for f in os.listdir(folder)
+                      if f.endswith('.svg'))
+
+    def test_unchanged_not_rendered(self):
+        known = dict()
+        self.assertEqual(self._rebuild(known), 2)
+        files = self._svg_files()
+        self.assertEqual(len(files), 2)
+        for filepath in files:
+            os.utime(filepath, (0, 0))
+
+        self.assertEqual(self._rebuild(known), 0)
+        self.assertEqual(self._svg_files(), files)
+        for filepath in files:
+            self.assertEqual(os.stat(filepath).st_mtime, 0)
+
+    def test_images_not_kept(self):
+        self._rebuild(dict())
+        self.assertEqual(len(self.app._signed_cards), 2)
+        self.assertFalse(any(isinstance(value, cbg.layout.Layouter)
+                             for value in vars(self.app).values()))
+
+
+class Daemon(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = self._tmp.name
+        self.addCleanup(self._tmp.cleanup)
+        write_spec(self.folder, ('alpha', 'beta'))
+        self.app = application(self.folder)
+
+    def test_render_in_memory(self):
+        known = dict()
+        response = self.app.render(known, title='^al')
+        self.assertEqual(len(response['pages']), 1)
+        self.assertIn('alpha', response['pages'][0]['svg'])
+        self.assertNotIn('beta', response['pages'][0]['svg'])
+        self.assertEqual(os.listdir(self.folder), ['d.json'])
+
+    def test_render_to_folder(self):
+        folder = os.path.join(self.folder, 'out')
+        response = self.app.render(dict(), layouter='singles', folder=folder)
+        self.assertEqual(len(response['pages']), 2)
+        for page in response['pages']:
+            self.assertTrue(os.path.isfile(page['path']))
+
+    def test_reload_on_change(self):
+        known = dict()
+        self.app.render(known)
+        deck = known['d'][1]
+
+        # Unchanged specifications are not read again.
+        self.app.render(known)
+        self.assertIs(known['d'][1], deck)
+
+        write_spec(self.folder, ('gamma',))
+        mtime = known['d'][0] + 1
+        os.utime(os.path.join(self.folder, 'd.json'), (mtime, mtime))
+        response = self.app.render(known)
+        self.assertIsNot(known['d'][1], deck)
+        self.assertIn('gamma', response['pages'][0]['svg'])
+
+    def test_bad_request(self):
+        with self.assertLogs(level='ERROR'):
+            response = self.app._respond(dict(), b'{"deck": "nonexistent"}')
+        self.assertIn('error', response)
+
+    def test_socket(self):
+        path = os.path.join(self.folder, 'socket')
+        thread = threading.Thread(target=self.app.serve, args=(path,))
+        thread.start()
+
+        def stop():
+            self.app.stop_serving()
+            thread.join()
+
+        self.addCleanup(stop)
+        self.assertTrue(self.app.serving.wait(5))
+
+        response = app.render_request(path, title='beta')
+        self.assertEqual(len(response['pages']), 1)
+        self.assertIn('beta', response['pages'][0]['svg'])
+
+        stop()
+        self.assertFalse(self.app.serving.is_set())
+        self.assertFalse(os.path.exists(path))
+
+
+class Print(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = self._tmp.name
+        self.app = application(self.folder)
+        self.app.folder_png = os.path.join(self.folder, 'png')
+        os.mkdir(self.app.folder_png)
+
+        # A stand-in for lp, recording its arguments.
+        bin_folder = os.path.join(self.folder, 'bin')
+        os.mkdir(bin_folder)
+        self.log = os.path.join(self.folder, 'lp.log')
+        lp = os.path.join(bin_folder, 'lp')
+        with open(lp, mode='w') as f:
+            f.write('#!/bin/sh\n'
+                    'echo "$@" >> {}\n'
+                    'echo "request id is fake-7 ($# argument(s))"\n'
+                    .format(self.log))
+        os.chmod(lp, stat.S_IRWXU)
+        path = bin_folder + os.pathsep + os.environ['PATH']
+        patcher = unittest.mock.patch.dict(os.environ, PATH=path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_one_job(self):
+        pngs = [os.path.join(self.app.folder_png, '{}.png'.format(n))
+                for n in ('03', '01', '02')]
+        for png in pngs:
+            open(png, mode='w').close()
+
+        with self.assertLogs(level='INFO') as logs:
+            self.app.print_output()
+
+        with open(self.log) as f:
+            calls = f.read().splitlines()
+        self.assertEqual(calls, [' '.join(['-o', 'media=A4', '-t', 'Test'] +
+                                          sorted(pngs))])
+        queued = [l for l in logs.output if 'queued in print job fake-7' in l]
+        self.assertEqual(len(queued), 3)
+        self.assertIn('Page 1 of 3', queued[0])
+        self.assertTrue(queued[0].endswith(sorted(pngs)[0]))
+
+    def test_nothing_to_print(self):
+        with self.assertLogs(level='WARNING'):
+            self.app.print_output()
+        self.assertFalse(os.path.exists(self.log))
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+'''Unit tests for CBG.'''
+
+import time
+import unittest
+
+import cbg.external as external
+
+
+class Runner(unittest.TestCase):
+    def test_output(self):
+        runner = external.Runner()
+        with self.assertLogs(level='DEBUG') as logs:
+            self.assertEqual(runner.run(['echo', 'a']), 'a\n')
+        self.assertIn('DEBUG:root:Subprocess output: a', logs.output)
+
+    def test_input(self):
+        self.assertEqual(external.Runner().run(['cat'], input='b\nc\n'),
+                         'b\nc\n')
+
+    def test_failures_in_place(self):
+        results = external.Runner(jobs=2).run_all(((['true'], None),
+                                                   (['false'], None),
+                                                   (['echo', 'c'], None)))
+        self.assertEqual(results[0], '')
+        self.assertIsInstance(results[1], external.Runner.Failure)
+        self.assertEqual(results[2], 'c\n')
+
+    def test_fail_fast(self):
+        with self.assertRaises(external.Runner.Failure):
+            external.Runner().run(['false'])
+
+    def test_timeout(self):
+        start = time.monotonic()
+        with self.assertRaises(external.Runner.Timeout):
+            external.Runner(timeout=0.2).run(['sleep', '10'])
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_timeout_per_call(self):
+        results = external.Runner(timeout=0.2).run_all(
+            ((['sleep', '0.5'], None), (['sleep', '0.5'], None)),
+            timeouts=(0.2, 5))
+        self.assertIsInstance(results[0], external.Runner.Timeout)
+        self.assertEqual(results[1], '')
+
+    def test_not_found_cancels_the_rest(self):
+        start = time.monotonic()
+        with self.assertRaises(external.Runner.NotFound):
+            external.Runner(jobs=2).run_all(((['sleep', '10'], None),
+                                             (['cbg-nonexistent'], None),
+                                             (['sleep', '10'], None)))
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_concurrency_limit(self):
+        start = time.monotonic()
+        external.Runner(jobs=2).run_all([(['sleep', '0.3'], None)] * 4)
+        self.assertGreater(time.monotonic() - start, 0.55)
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+'''Unit tests for CBG.'''
+
+import os
+import tempfile
+import unittest
+
+import cbg
+import cbg.keys as keys
+import cbg.layout as layout
+from cbg.sample import size
+
+
+class Front(cbg.svg.card.CardFront):
+    size = size.MINI_EURO
+
+
+class TitlePresenter(cbg.svg.presenter.TextPresenter):
+    Wardrobe = cbg.sample.wardrobe.MiniEuroMain
+
+
+class TitleField(cbg.content.text.TextField):
+    key = keys.TITLE
+    presenter_class_front = TitlePresenter
+
+
+class Card(cbg.content.card.Card):
+    plan = (TitleField,)
+    presenter_class_front = Front
+
+
+class BlurredFront(Front):
+    '''A front that defines a filter of its own.'''
+
+    def present(self):
+        super().present()
+        blur = cbg.svg.filter.GaussianBlur.new(int(self.field.title[1:]) + 1)
+        self.define(blur)
+
+
+class BlurredCard(Card):
+    presenter_class_front = BlurredFront
+
+
+def make_cards(n_unique, copies, card_cls=Card):
+    raw = {'c{}'.format(i): {keys.METADATA: {keys.COPIES: copies}}
+           for i in range(n_unique)}
+    deck = cbg.content.deck.Deck(card_cls, raw=raw, filename_base='d')
+    return sorted(deck.flat())
+
+
+def saved(layouter):
+    '''Save a layouter's images. Return a dict of file contents.'''
+    layouter.run(True, False)
+    with tempfile.TemporaryDirectory() as folder:
+        layouter.save(folder, game='t')
+        ret = dict()
+        for filename in sorted(os.listdir(folder)):
+            with open(os.path.join(folder, filename), mode='rb') as f:
+                ret[filename] = f.read()
+        return ret
+
+
+class Pool(unittest.TestCase):
+    def test_same_as_serial(self):
+        cards = make_cards(7, 3)
+        kwargs = dict(image_size=size.A4, image_margins=size.A4_MARGINS)
+        serial = saved(layout.Layouter(cards, **kwargs))
+        parallel = saved(layout.Layouter(cards, jobs=2, **kwargs))
+        self.assertEqual(len(serial), 2)
+        self.assertEqual(serial, parallel)
+
+    def test_definitions_same_as_serial(self):
+        cards = make_cards(7, 3, card_cls=BlurredCard)
+        kwargs = dict(image_size=size.A4, image_margins=size.A4_MARGINS)
+        parallel = [saved(layout.Layouter(cards, jobs=4, **kwargs))
+                    for _ in range(3)]
+        self.assertEqual(parallel[0], parallel[1])
+        self.assertEqual(parallel[0], parallel[2])
+
+        cbg.svg.svg.SVGElement.content_addressed_ids = True
+        try:
+            serial = saved(layout.Layouter(cards, **kwargs))
+        finally:
+            cbg.svg.svg.SVGElement.content_addressed_ids = False
+        self.assertEqual(len(serial), 2)
+        self.assertEqual(serial, parallel[0])
+        for code in serial.values():
+            self.assertIn(b'<filter', code)
+
+    def test_fan_same_as_serial(self):
+        cards = make_cards(4, 1)
+        serial = saved(layout.Fan(cards))
+        parallel = saved(layout.Fan(cards, jobs=2))
+        self.assertEqual(len(serial), 1)
+        self.assertEqual(serial, parallel)
+
+
+class Signatures(unittest.TestCase):
+    kwargs = dict(image_size=size.A4, image_margins=size.A4_MARGINS,
+                  defer=True)
+
+    def _save(self, cards, signatures=None):
+        layouter = layout.Layouter(cards, **self.kwargs)
+        layouter.run(True, False)
+        layouter.save(self.folder.name, signatures=signatures, game='t')
+        return layouter
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _overwrite(self, image):
+        with open(image.filepath, mode='w') as f:
+            f.write('sentinel')
+
+    def _read(self, image):
+        with open(image.filepath) as f:
+            return f.read()
+
+    def test_unchanged_not_rendered(self):
+        cards = make_cards(3, 1)
+        first = self._save(cards)
+        signatures = {i.filename: (i.signature, i.digest) for i in first}
+        self._overwrite(first[0])
+
+        second = self._save(cards, signatures=signatures)
+        self.assertEqual(self._read(second[0]), 'sentinel')
+        self.assertEqual(second[0].digest, first[0].digest)
+
+    def test_new_cards_rendered(self):
+        first = self._save(make_cards(3, 1))
+        signatures = {i.filename: (i.signature, i.digest) for i in first}
+        self._overwrite(first[0])
+
+        second = self._save(make_cards(3, 1), signatures=signatures)
+        self.assertNotEqual(self._read(second[0]), 'sentinel')
+
+
+class Stream(unittest.TestCase):
+    kwargs = dict(image_size=size.A4, image_margins=size.A4_MARGINS)
+
+    def test_same_as_serial(self):
+        cards = make_cards(7, 3)
+        serial = saved(layout.Layouter(cards, **self.kwargs))
+        streamed = saved(layout.Layouter(cards, stream=True, **self.kwargs))
+        self.assertEqual(serial, streamed)
+
+    def test_released(self):
+        layouter = layout.Layouter(make_cards(7, 3), stream=True,
+                                   **self.kwargs)
+        saved(layouter)
+        self.assertTrue(all(image.xml is None for image in layouter))
+        self.assertTrue(all(image.digest for image in layouter))
+
+
+class Duplex(unittest.TestCase):
+    def test_alternating(self):
+        class DuplexCard(Card):
+            presenter_class_back = Front
+
+        raw = {'c{}'.format(i): {keys.METADATA: {keys.COPIES: 3}}
+               for i in range(7)}
+        deck = cbg.content.deck.Deck(DuplexCard, raw=raw, filename_base='d')
+        layouter = layout.Duplex(sorted(deck.flat()), image_size=size.A4,
+                                 image_margins=size.A4_MARGINS)
+        layouter.run(True, True)
+        self.assertEqual([image.left_to_right for image in layouter],
+                         [True, False, True, False])
+
+
+class Stamps(unittest.TestCase):
+    def _count_drawings(self, reusable, layouter_cls=layout.Layouter):
+        drawn = []
+
+        class Counting(Front):
+            def present(self):
+                drawn.append(self.field)
+                super().present()
+
+        class CountingBack(Counting):
+            pass
+
+        Counting.reusable = reusable
+
+        class CountingCard(Card):
+            presenter_class_front = Counting
+            presenter_class_back = CountingBack
+
+        raw = {'c{}'.format(i): {keys.METADATA: {keys.COPIES: 3}}
+               for i in range(4)}
+        deck = cbg.content.deck.Deck(CountingCard, raw=raw,
+                                     filename_base='d')
+        layouter = layouter_cls(sorted(deck.flat()), image_size=size.A4,
+                                image_margins=size.A4_MARGINS)
+        layouter.run(True, layouter_cls is not layout.Layouter)
+        return layouter, len(drawn)
+
+    def test_drawn_once_per_card(self):
+        layouter, n_drawn = self._count_drawings(True)
+        self.assertEqual(n_drawn, 4)
+        self.assertEqual(sum(len(image.subjects) for image in layouter), 12)
+
+    def test_both_sides_alternating(self):
+        layouter, n_drawn = self._count_drawings(True, layout.Neighbours)
+        self.assertEqual(n_drawn, 8)
+        self.assertEqual(sum(len(image.subjects) for image in layouter), 24)
+
+    def test_both_sides_duplex(self):
+        _, n_drawn = self._count_drawings(True, layout.Duplex)
+        self.assertEqual(n_drawn, 8)
+
+    def test_not_reusable(self):
+        _, n_drawn = self._count_drawings(False)
+        self.assertEqual(n_drawn, 12)
+
+    def test_translated(self):
+        layouter, _ = self._count_drawings(True)
+        groups = [g for g in layouter[0].xml if g.tag == 'g']
+        self.assertTrue(all(g.get('transform').startswith('translate(')
+                            for g in groups))
+        self.assertEqual(len(set(g.get('transform') for g in groups)),
+                         len(groups))
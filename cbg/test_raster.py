@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+'''Unit tests for CBG.'''
+
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+import cbg.raster as raster
+
+
+class Registry(unittest.TestCase):
+    def test_builtins(self):
+        for name in ('inkscape', 'inkscape-shell', 'rsvg-convert'):
+            self.assertIn(name, raster.Rasterizer.registry)
+
+    def test_inkscape_command(self):
+        r = raster.Inkscape(300)
+        self.assertEqual(r.command('a.svg', 'a.png'),
+                         ['inkscape', '-e', 'a.png', '-d', '300', 'a.svg'])
+
+
+class OneShot(unittest.TestCase):
+    class Implementation(raster.OneShot):
+        def command(self, svg_filepath, png_filepath):
+            # POSIX utilities standing in for a real rasterizer.
+            return ['false' if svg_filepath.startswith('bad') else 'true']
+
+    def test_errors_collected_per_image(self):
+        r = self.Implementation(300, jobs=2)
+        errors = r.rasterize((('good0', ''), ('bad1', ''), ('good2', ''),
+                              ('bad3', '')))
+        self.assertEqual(sorted(errors), ['bad1', 'bad3'])
+
+    def test_missing_program(self):
+        class Implementation(raster.OneShot):
+            def command(self, svg_filepath, png_filepath):
+                return ['cbg-nonexistent-program']
+
+        errors = Implementation(300).rasterize((('a', ''),))
+        self.assertIn('not found', errors['a'])
+
+
+class InkscapeShell(unittest.TestCase):
+    # Stands in for Inkscape in shell mode, recording its input and
+    # writing an empty PNG for each SVG not named as bad.
+    STAND_IN = '''#!{}
+import shlex, sys
+script = sys.stdin.read()
+with open({!r}, mode='a') as f:
+    f.write(script + '---\\n')
+for line in script.splitlines():
+    if line == 'quit':
+        break
+    svg, _, png, _, dpi = shlex.split(line)
+    if 'bad' not in svg:
+        open(png, mode='w').close()
+'''
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.folder = self._tmp.name
+        self.log = os.path.join(self.folder, 'log')
+        bin_folder = os.path.join(self.folder, 'bin')
+        os.mkdir(bin_folder)
+        inkscape = os.path.join(bin_folder, 'inkscape')
+        with open(inkscape, mode='w') as f:
+            f.write(self.STAND_IN.format(sys.executable, self.log))
+        os.chmod(inkscape, stat.S_IRWXU)
+        path = bin_folder + os.pathsep + os.environ['PATH']
+        patcher = unittest.mock.patch.dict(os.environ, PATH=path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _pairs(self, *names):
+        return [(os.path.join(self.folder, n + '.svg'),
+                 os.path.join(self.folder, n + '.png')) for n in names]
+
+    def _scripts(self):
+        with open(self.log) as f:
+            return f.read().split('---\n')[:-1]
+
+    def test_batch_script(self):
+        r = raster.InkscapeShell(150)
+        call = r._batch_call([('a b.svg', "it's.png"), ('c.svg', 'c.png')])
+        self.assertEqual(call, (['inkscape', '--shell'],
+                                "'a b.svg' -e 'it'\"'\"'s.png' -d 150\n"
+                                'c.svg -e c.png -d 150\n'
+                                'quit\n'))
+
+    def test_batches(self):
+        pairs = self._pairs('0', '1', '2', '3', '4')
+        self.assertEqual(raster.InkscapeShell(300, jobs=2).rasterize(pairs),
+                         {})
+        scripts = sorted(self._scripts())
+        self.assertEqual(len(scripts), 2)
+        self.assertEqual([s.count(' -e ') for s in scripts], [3, 2])
+        for svg_filepath, png_filepath in pairs:
+            self.assertTrue(os.path.exists(png_filepath))
+
+    def test_one_batch_per_image_at_most(self):
+        raster.InkscapeShell(300, jobs=4).rasterize(self._pairs('0', '1'))
+        self.assertEqual(len(self._scripts()), 2)
+
+    def test_missing_output(self):
+        pairs = self._pairs('good', 'bad')
+        errors = raster.InkscapeShell(300).rasterize(pairs)
+        self.assertEqual(list(errors), [pairs[1][0]])
+        self.assertIn('No output', errors[pairs[1][0]])
+
+    def test_stale_output_removed(self):
+        pairs = self._pairs('bad')
+        open(pairs[0][1], mode='w').close()
+        errors = raster.InkscapeShell(300).rasterize(pairs)
+        self.assertEqual(list(errors), [pairs[0][0]])
+
+
+class Timeout(unittest.TestCase):
+    class Batch(raster.Rasterizer):
+        '''A stand-in taking 0.15 seconds per image, in one batch.'''
+        def convert(self, pairs):
+            call = (['sleep', str(0.15 * len(pairs))], None)
+            return self._run_all([pairs], [call])
+
+    def test_scaled_by_batch(self):
+        pairs = [(str(i), '') for i in range(4)]
+        self.assertEqual(self.Batch(300, timeout=0.3).rasterize(pairs), {})
+
+    def test_exceeded(self):
+        pairs = [(str(i), '') for i in range(4)]
+        errors = self.Batch(300, timeout=0.1).rasterize(pairs)
+        self.assertEqual(sorted(errors), ['0', '1', '2', '3'])
+        self.assertIn('timed out', errors['0'])
+
+
+class Cache(unittest.TestCase):
+    class Copier(raster.Rasterizer):
+        '''A stand-in that copies SVG code and records its work.'''
+        name = 'copier'
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.done = []
+
+        def convert(self, pairs):
+            for svg_filepath, png_filepath in pairs:
+                shutil.copyfile(svg_filepath, png_filepath)
+                self.done.append(svg_filepath)
+            return dict()
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def _path(self, filename, content=None):
+        filepath = os.path.join(self.folder.name, filename)
+        if content is not None:
+            with open(filepath, mode='w') as f:
+                f.write(content)
+        return filepath
+
+    def _contents(self, filepath):
+        with open(filepath) as f:
+            return f.read()
+
+    def test_hit(self):
+        a, b = self._path('a.svg', 'x'), self._path('b.svg', 'x')
+        cache_dir = self._path('cache')
+
+        r = self.Copier(300)
+        cache = raster.Cache(r, cache_dir)
+        self.assertEqual(cache.rasterize(((a, self._path('a.png')),)), {})
+        self.assertEqual(cache.rasterize(((b, self._path('b.png')),)), {})
+        self.assertEqual(r.done, [a])
+        self.assertEqual(self._contents(self._path('b.png')), 'x')
+
+    def test_miss_on_content(self):
+        a, b = self._path('a.svg', 'x'), self._path('b.svg', 'y')
+        r = self.Copier(300)
+        cache = raster.Cache(r, self._path('cache'))
+        cache.rasterize(((a, self._path('a.png')),))
+        cache.rasterize(((b, self._path('b.png')),))
+        self.assertEqual(r.done, [a, b])
+
+    def test_miss_on_resolution(self):
+        a = self._path('a.svg', 'x')
+        r0, r1 = self.Copier(300), self.Copier(600)
+        raster.Cache(r0, self._path('cache')).rasterize(
+            ((a, self._path('a.png')),))
+        raster.Cache(r1, self._path('cache')).rasterize(
+            ((a, self._path('a.png')),))
+        self.assertEqual(r1.done, [a])
+
+    def test_cached_file_not_overwritten(self):
+        a, b = self._path('a.svg', 'x'), self._path('b.svg', 'y')
+        png = self._path('out.png')
+        r = self.Copier(300)
+        cache = raster.Cache(r, self._path('cache'))
+        cache.rasterize(((a, png),))
+        cache.rasterize(((b, png),))
+        cache.rasterize(((a, png),))
+        self.assertEqual(self._contents(png), 'x')
+        self.assertEqual(r.done, [a, b])
+
+    def test_cached_file_not_overwritten_without_cache(self):
+        a, b = self._path('a.svg', 'x'), self._path('b.svg', 'y')
+        png = self._path('out.png')
+        cache = raster.Cache(self.Copier(300), self._path('cache'))
+        cache.rasterize(((a, png),))
+        cache.rasterize(((a, png),))  # Linked from the cache.
+
+        # The copier writes in place, as external programs may.
+        self.Copier(300).rasterize(((b, png),))
+        self.assertEqual(self._contents(png), 'y')
+        cached = cache.filepath(cache.key(a))
+        self.assertEqual(self._contents(cached), 'x')
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+'''Unit tests for CBG.'''
+
+import json
+import os
+import tempfile
+import unittest
+
+import lxml.etree
+
+import cbg.content.deck
+import cbg.layout as layout
+import cbg.render as render
+import cbg.test_layout as test_layout
+
+
+DECKS = {'d': test_layout.Card}
+SPEC = {'alpha': {}, 'beta': {}, 'gamma': {}}
+
+
+class Render(unittest.TestCase):
+    def test_bytes(self):
+        pages = render.render(DECKS, specs={'d': SPEC})
+        self.assertEqual(list(pages), ['1.svg'])
+        code = pages['1.svg']
+        self.assertIsInstance(code, bytes)
+        for title in SPEC:
+            self.assertIn(title.encode(), code)
+
+    def test_trees(self):
+        pages = render.render(DECKS, specs={'d': SPEC}, trees=True)
+        tree = pages['1.svg']
+        self.assertIsInstance(tree, lxml.etree._Element)
+        self.assertEqual(lxml.etree.tostring(tree, pretty_print=True),
+                         render.render(DECKS, specs={'d': SPEC})['1.svg'])
+
+    def test_same_as_saved(self):
+        pages = render.render(DECKS, specs={'d': SPEC}, naming={'game': 't'},
+                              layouter='singles')
+        decks = render.read_decks(DECKS, specs={'d': SPEC})
+        cards = cbg.content.deck.flat_sorted(decks)
+        saved = test_layout.saved(layout.Singles(cards))
+        self.assertEqual(pages, saved)
+
+    def test_spec_path(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'd.json')
+            with open(path, mode='w') as f:
+                json.dump(SPEC, f)
+            by_path = render.render(DECKS, specs={'d': path})
+            by_folder = render.render(DECKS, folder_specs=folder)
+        self.assertEqual(by_path, render.render(DECKS, specs={'d': SPEC}))
+        self.assertEqual(by_path, by_folder)
+
+    def test_selection(self):
+        pages = render.render(DECKS, specs={'d': SPEC}, title='^[ab]',
+                              selection={'blacklist': ['alpha']})
+        code = pages['1.svg']
+        self.assertIn(b'beta', code)
+        self.assertNotIn(b'alpha', code)
+        self.assertNotIn(b'gamma', code)
+
+    def test_both_sides_paired(self):
+        decks = render.read_decks(DECKS, specs={'d': SPEC})
+        images = render.lay_out(decks, layouter='neighbours')
+        self.assertEqual(len(images), 1)
+
+    def test_unknown_layouter(self):
+        with self.assertRaises(ValueError):
+            render.render(DECKS, specs={'d': SPEC}, layouter='nonexistent')
+
+    def test_missing_spec(self):
+        with self.assertRaisesRegex(ValueError, '"e"'):
+            render.read_decks(dict(DECKS, e=test_layout.Card),
+                              specs={'d': SPEC})
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+'''Unit tests for CBG.'''
+
+import io
+import os
+import tarfile
+import tempfile
+import unittest
+import zipfile
+
+import cbg.layout as layout
+import cbg.sink as sink
+import cbg.test_layout as test_layout
+from cbg.sample import size
+
+
+KWARGS = dict(image_size=size.A4, image_margins=size.A4_MARGINS)
+
+
+class Sinks(unittest.TestCase):
+    def test_for_path(self):
+        self.assertIsInstance(sink.Sink.for_path('out'), sink.Folder)
+        self.assertIsInstance(sink.Sink.for_path('-'), sink.TarStream)
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'out.ZIP')
+            with sink.Sink.for_path(path) as s:
+                self.assertIsInstance(s, sink.ZipArchive)
+
+    def test_put_unchanged(self):
+        with tempfile.TemporaryDirectory() as folder:
+            s = sink.Folder(folder)
+            digest = s.put('a', b'code')
+            os.utime(s.path('a'), (0, 0))
+            self.assertEqual(s.put('a', b'code', previous_digest=digest),
+                             digest)
+            self.assertEqual(os.stat(s.path('a')).st_mtime, 0)
+
+            # A missing file is rewritten even if unchanged.
+            os.remove(s.path('a'))
+            s.put('a', b'code', previous_digest=digest)
+            self.assertIn('a', s)
+
+    def test_zip(self):
+        buffer = io.BytesIO()
+        with sink.ZipArchive(buffer) as s:
+            s.put('a', b'alpha')
+            self.assertIn('a', s)
+        with zipfile.ZipFile(buffer) as archive:
+            self.assertEqual(archive.read('a'), b'alpha')
+
+    def test_tar(self):
+        buffer = io.BytesIO()
+        with sink.TarStream(buffer) as s:
+            s.put('a', b'alpha')
+            s.put('b', b'beta')
+        buffer.seek(0)
+        with tarfile.open(fileobj=buffer) as archive:
+            self.assertEqual(archive.getnames(), ['a', 'b'])
+            self.assertEqual(archive.extractfile('b').read(), b'beta')
+
+
+class Layouter(unittest.TestCase):
+    def test_memory_same_as_folder(self):
+        cards = test_layout.make_cards(7, 3)
+        saved = test_layout.saved(layout.Layouter(cards, **KWARGS))
+
+        memory = sink.Memory()
+        images = layout.Layouter(cards, **KWARGS)
+        images.run(True, False)
+        images.save(memory, game='t')
+        self.assertEqual(dict(memory), saved)
+
+    def test_memory_from_pool(self):
+        cards = test_layout.make_cards(7, 3)
+        saved = test_layout.saved(layout.Layouter(cards, **KWARGS))
+
+        memory = sink.Memory()
+        images = layout.Layouter(cards, jobs=2, **KWARGS)
+        images.run(True, False)
+        images.save(memory, game='t')
+        self.assertEqual(list(memory), sorted(saved))
+        self.assertEqual(dict(memory), saved)
+        for image in images:
+            self.assertIsNotNone(image.digest)